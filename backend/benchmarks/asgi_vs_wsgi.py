@@ -0,0 +1,98 @@
+"""
+Compara a vazão do backend sob WSGI e sob ASGI com carga mista: alguns
+clientes pedindo relatórios pesados enquanto outros bipam códigos de barras e
+fazem buscas de digitação (typeahead).
+
+Suba os dois servidores com o mesmo banco (já populado) e o mesmo número de
+workers, a partir de backend/:
+
+    gunicorn dolphinpdv.wsgi -w 1 --threads 4 -b 127.0.0.1:8001
+    uvicorn dolphinpdv.asgi:application --workers 1 --port 8002
+
+e rode:
+
+    python benchmarks/asgi_vs_wsgi.py http://127.0.0.1:8001 http://127.0.0.1:8002 \\
+        --barcode 7891000100103 --search arroz --token <token>
+
+O resultado (JSON) traz, por servidor e por tipo de requisição, a vazão e a
+latência p50/p95/p99 em milissegundos.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from stats import percentile
+
+
+async def worker(client, paths, deadline, latencies, errors):
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.monotonic()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.monotonic() - start)
+
+
+async def run(base_url, args):
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    report_paths = [f'/api/reports/sales/?from={args.report_from}', '/api/reports/inventory/']
+    scan_paths = [f'/api/products/barcode/{args.barcode}/', f'/api/products/?search={args.search}']
+    limits = httpx.Limits(max_connections=args.reports + args.scanners)
+
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        deadline = time.monotonic() + args.duration
+        groups = {'reports': (args.reports, report_paths), 'scans': (args.scanners, scan_paths)}
+        collected = {name: ([], []) for name in groups}
+        await asyncio.gather(*[
+            worker(client, paths, deadline, *collected[name])
+            for name, (count, paths) in groups.items()
+            for _ in range(count)
+        ])
+
+    for name, (latencies, errors) in collected.items():
+        results[name] = {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'throughput_rps': round(len(latencies) / args.duration, 2),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('wsgi_url', help='URL base do servidor WSGI (ex.: gunicorn)')
+    parser.add_argument('asgi_url', help='URL base do servidor ASGI (ex.: uvicorn)')
+    parser.add_argument('--barcode', required=True, help='Código de barras existente para as bipagens')
+    parser.add_argument('--search', default='a', help='Termo das buscas de digitação')
+    parser.add_argument('--report-from', default='2000-01-01', help='Início do período do relatório de vendas')
+    parser.add_argument('--token', help='Token Bearer, se a API exigir autenticação')
+    parser.add_argument('--reports', type=int, default=4, help='Clientes pedindo relatórios')
+    parser.add_argument('--scanners', type=int, default=16, help='Clientes bipando/buscando')
+    parser.add_argument('--duration', type=float, default=30, help='Segundos de carga por servidor')
+    args = parser.parse_args()
+
+    output = {}
+    for name, url in (('wsgi', args.wsgi_url), ('asgi', args.asgi_url)):
+        output[name] = asyncio.run(run(url, args))
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
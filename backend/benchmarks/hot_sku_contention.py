@@ -0,0 +1,134 @@
+"""
+Contenção em um produto muito vendido (hot SKU): várias threads vendendo o
+mesmo produto ao mesmo tempo via commit_sale(), cada uma com sua conexão.
+
+Roda dentro do processo Django, contra o banco configurado (PDV_DB_*). Use um
+banco descartável, já migrado; o script cria seu próprio produto. A partir
+de backend/:
+
+    PDV_DB_NAME=/tmp/bench.sqlite3 python manage.py migrate
+    PDV_DB_NAME=/tmp/bench.sqlite3 python benchmarks/hot_sku_contention.py --threads 16
+
+    PDV_DB_ENGINE=postgresql PDV_DB_NAME=pdv_bench python benchmarks/hot_sku_contention.py
+
+O estoque inicial é menor que o total pedido, então parte das vendas deve ser
+rejeitada. O resultado (JSON) traz vazão, latência p50/p95/p99, vendas
+aceitas e rejeitadas, e a conferência final: saldo materializado, soma dos
+lotes e unidades vendidas devem bater, sem estoque negativo.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dolphinpdv.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connections  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+
+from pdv.models import Batch, Category, Inventory, PaymentMethod, Product, SaleItem, User  # noqa: E402
+from pdv.sales import SaleError, commit_sale  # noqa: E402
+from pdv.stock import adjust_stock  # noqa: E402
+from stats import percentile  # noqa: E402
+
+
+def setup(batches, batch_size):
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'name': 'Benchmark'})
+    payment_method, _ = PaymentMethod.objects.get_or_create(name='Benchmark')
+    category, _ = Category.objects.get_or_create(name='Benchmark')
+    product = Product.objects.create(name=f'Hot SKU {time.time_ns()}', category=category, price=1)
+    for _ in range(batches):
+        batch = Batch.objects.create(product=product, quantity=batch_size)
+        Inventory.objects.create(product=product, batch=batch, quantity=batch_size)
+    adjust_stock({product.id: batches * batch_size})
+    return user, payment_method, product
+
+
+def seller(user, payment_method, product, sales, quantity, latencies, outcomes):
+    try:
+        for _ in range(sales):
+            start = time.monotonic()
+            try:
+                commit_sale(user, payment_method, [{'product_id': product.id, 'quantity': quantity}])
+                outcomes.append('accepted')
+            except SaleError:
+                outcomes.append('rejected')
+            except Exception as e:
+                outcomes.append(type(e).__name__)
+            latencies.append(time.monotonic() - start)
+    finally:
+        connections.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='Terminais vendendo ao mesmo tempo')
+    parser.add_argument('--sales', type=int, default=50, help='Vendas por terminal')
+    parser.add_argument('--quantity', type=int, default=1, help='Unidades por venda')
+    parser.add_argument('--batches', type=int, default=5, help='Lotes do produto')
+    parser.add_argument('--stock-ratio', type=float, default=0.8,
+                        help='Estoque inicial como fração do total pedido (< 1 força rejeições)')
+    args = parser.parse_args()
+
+    requested = args.threads * args.sales * args.quantity
+    batch_size = max(1, int(requested * args.stock_ratio) // args.batches)
+    user, payment_method, product = setup(args.batches, batch_size)
+    initial = args.batches * batch_size
+    connections.close_all()
+
+    latencies, outcomes = [], []
+    threads = [
+        threading.Thread(target=seller, args=(user, payment_method, product, args.sales, args.quantity, latencies, outcomes))
+        for _ in range(args.threads)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    product.refresh_from_db()
+    inventory = Inventory.objects.filter(product=product)
+    batches_total = inventory.aggregate(total=Sum('quantity'))['total'] or 0
+    sold = SaleItem.objects.filter(product=product).aggregate(total=Sum('units'))['total'] or 0
+    accepted = outcomes.count('accepted')
+
+    print(json.dumps({
+        'database': connections['default'].vendor,
+        'threads': args.threads,
+        'sales': len(outcomes),
+        'accepted': accepted,
+        'rejected': outcomes.count('rejected'),
+        'errors': len(outcomes) - accepted - outcomes.count('rejected'),
+        'throughput_sales_per_s': round(len(outcomes) / elapsed, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'stock': {
+            'initial': initial,
+            'materialized': product.stock,
+            'batches': batches_total,
+            'sold': sold,
+            'negative_batches': inventory.filter(quantity__lt=0).count(),
+            'consistent': (
+                product.stock == batches_total == initial - sold
+                and sold == accepted * args.quantity
+                and not inventory.filter(quantity__lt=0).exists()
+            ),
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
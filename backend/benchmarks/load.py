@@ -0,0 +1,228 @@
+"""
+Carga mista nas rotas reais do PDV: bipagem (produto por código de barras),
+busca e listagem de produtos, criação de vendas e os relatórios de vendas e de
+estoque, com vários clientes concorrentes.
+
+Gere os dados antes, em um banco descartável (a partir de backend/):
+
+    export PDV_DB_NAME=/tmp/bench.sqlite3
+    python manage.py migrate
+    python manage.py generate_dataset --products 20000 --sales 1000000
+
+Por padrão as requisições passam pela pilha completa do Django dentro deste
+processo (django.test.Client, uma conexão por thread), o que permite contar
+as consultas ao banco de cada requisição:
+
+    python benchmarks/load.py --clients 8 --duration 30
+
+Com --url, a carga vai para um servidor já rodando sobre o mesmo banco; as
+amostras (códigos de barras, produtos) continuam vindo do banco configurado e
+as consultas por requisição não são medidas:
+
+    python benchmarks/load.py --url http://127.0.0.1:8000
+
+O resultado (JSON) traz o commit, e por rota: requisições, erros, vazão,
+latência p50/p95/p99 em milissegundos e consultas por requisição. Salve com
+--output para comparar execuções entre commits.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dolphinpdv.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from pdv.models import PaymentMethod, Product, User  # noqa: E402
+from stats import percentile  # noqa: E402
+
+# Peso de cada tipo de requisição na carga
+MIX = {
+    'barcode': 45,
+    'search': 20,
+    'products': 5,
+    'create_sale': 20,
+    'sales_report': 5,
+    'inventory_report': 5,
+}
+
+SEARCH_TERMS = ('arroz', 'feijao', 'cafe', 'leite', 'oleo', 'biscoito', 'suco', 'queijo', 'sabao', 'agua')
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BACKEND, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def samples(size):
+    barcodes = list(Product.objects.exclude(barcode=None).order_by('?').values_list('barcode', flat=True)[:size])
+    # Vendas nos produtos com mais estoque, para não esgotá-los durante a carga
+    stocked = list(Product.objects.order_by('-stock').values_list('id', flat=True)[:size])
+    user = User.objects.filter(is_active=True).order_by('id').first()
+    payment_method = PaymentMethod.objects.order_by('id').first()
+    if not (barcodes and stocked and user and payment_method):
+        raise SystemExit('Banco sem dados; rode python manage.py generate_dataset antes')
+    return barcodes, stocked, user.username, payment_method.id
+
+
+def requests(rng, barcodes, stocked, username, payment_method_id, report_from):
+    """Gera (tipo, método, caminho, corpo) segundo MIX."""
+    kinds, weights = zip(*MIX.items())
+    while True:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'barcode':
+            yield kind, 'GET', f'/api/products/barcode/{rng.choice(barcodes)}/', None
+        elif kind == 'search':
+            term = rng.choice(SEARCH_TERMS)
+            yield kind, 'GET', f'/api/products/?search={term[:rng.randint(2, len(term))]}', None
+        elif kind == 'products':
+            yield kind, 'GET', '/api/products/', None
+        elif kind == 'create_sale':
+            yield kind, 'POST', '/api/sales/create/', {
+                'username': username,
+                'payment_method_id': payment_method_id,
+                'items': [
+                    {'product_id': product_id, 'quantity': 1}
+                    for product_id in rng.sample(stocked, rng.randint(1, 5))
+                ]
+            }
+        elif kind == 'sales_report':
+            yield kind, 'GET', f'/api/reports/sales/?from={report_from}', None
+        else:
+            yield kind, 'GET', '/api/reports/inventory/', None
+
+
+class InProcessDriver:
+    def __init__(self):
+        # Um host aceito por ALLOWED_HOSTS ('testserver' só vale nos testes)
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        self.client = Client(HTTP_HOST=host)
+
+    def send(self, method, path, body):
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'POST':
+                response = self.client.post(path, json.dumps(body), content_type='application/json')
+            else:
+                response = self.client.get(path)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        return response.status_code, len(queries)
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpDriver:
+    def __init__(self, url):
+        import httpx
+        self.client = httpx.Client(base_url=url, timeout=60)
+
+    def send(self, method, path, body):
+        response = self.client.request(method, path, json=body)
+        return response.status_code, None
+
+    def close(self):
+        self.client.close()
+
+
+def client(driver, stream, deadline, results):
+    try:
+        while time.monotonic() < deadline:
+            kind, method, path, body = next(stream)
+            start = time.monotonic()
+            try:
+                status, queries = driver.send(method, path, body)
+            except Exception as e:
+                results[kind]['errors'].append(type(e).__name__)
+                continue
+            elapsed = time.monotonic() - start
+            if status >= 400:
+                results[kind]['errors'].append(status)
+                continue
+            results[kind]['latencies'].append(elapsed)
+            if queries is not None:
+                results[kind]['queries'].append(queries)
+    finally:
+        driver.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='URL base de um servidor rodando; sem ela, a carga roda neste processo')
+    parser.add_argument('--clients', type=int, default=8, help='Clientes concorrentes')
+    parser.add_argument('--duration', type=float, default=30, help='Segundos de carga')
+    parser.add_argument('--report-from', default='2000-01-01', help='Início do período do relatório de vendas')
+    parser.add_argument('--samples', type=int, default=1000, help='Códigos de barras e produtos sorteados')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Também grava o JSON neste arquivo')
+    args = parser.parse_args()
+
+    barcodes, stocked, username, payment_method_id = samples(args.samples)
+    connections.close_all()
+
+    results = {kind: {'latencies': [], 'errors': [], 'queries': []} for kind in MIX}
+    deadline = time.monotonic() + args.duration
+    threads = []
+    for i in range(args.clients):
+        rng = random.Random(args.seed + i)
+        stream = requests(rng, barcodes, stocked, username, payment_method_id, args.report_from)
+        driver = HttpDriver(args.url) if args.url else InProcessDriver()
+        threads.append(threading.Thread(target=client, args=(driver, stream, deadline, results)))
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    output = {
+        'commit': commit(),
+        'database': connection.vendor,
+        'mode': 'http' if args.url else 'in-process',
+        'clients': args.clients,
+        'duration_s': round(elapsed, 2),
+        'throughput_rps': round(sum(len(r['latencies']) for r in results.values()) / elapsed, 2),
+        'endpoints': {
+            kind: {
+                'requests': len(r['latencies']),
+                'errors': len(r['errors']),
+                'throughput_rps': round(len(r['latencies']) / elapsed, 2),
+                'mean_ms': round(statistics.mean(r['latencies']) * 1000, 2) if r['latencies'] else None,
+                'p50_ms': percentile(r['latencies'], 50),
+                'p95_ms': percentile(r['latencies'], 95),
+                'p99_ms': percentile(r['latencies'], 99),
+                'queries_per_request': round(statistics.mean(r['queries']), 2) if r['queries'] else None,
+            }
+            for kind, r in results.items()
+        },
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""Estatísticas de latência comuns aos scripts de benchmark."""
+
+
+def percentile(values, pct):
+    """Percentil `pct` de `values` (latências em segundos), em milissegundos."""
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, round(pct / 100 * (len(values) - 1)))
+    return round(values[index] * 1000, 2)
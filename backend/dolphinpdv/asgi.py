@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dolphinpdv.settings')
+# Rotas de leitura (catálogo, estoque, relatórios) com as views assíncronas
+os.environ.setdefault('PDV_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
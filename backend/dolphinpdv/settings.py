@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,8 +54,10 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'pdv.middleware.TokenAuthMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pdv.middleware.InstrumentationMiddleware',
+    'pdv.middleware.TokenAuthMiddleware',
+    'pdv.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,10 +85,79 @@ WSGI_APPLICATION = 'dolphinpdv.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# Configurado por variáveis de ambiente. Padrão: SQLite em BASE_DIR/db.sqlite3.
+#   PDV_DB_ENGINE=postgresql  PDV_DB_NAME  PDV_DB_USER  PDV_DB_PASSWORD
+#   PDV_DB_HOST  PDV_DB_PORT  PDV_DB_CONN_MAX_AGE (segundos; conexões persistentes)
+#   PDV_DB_POOL=1             pool nativo do Django (exige psycopg 3 com [pool])
+#   PDV_DB_POOL_MAX_SIZE      tamanho máximo do pool
+#   PDV_DB_PGBOUNCER=1        atrás do PgBouncer em modo transaction
+
+PDV_DB_ENGINE = os.environ.get('PDV_DB_ENGINE', 'sqlite')
+
+if PDV_DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PDV_DB_NAME', 'dolphinpdv'),
+            'USER': os.environ.get('PDV_DB_USER', 'dolphinpdv'),
+            'PASSWORD': os.environ.get('PDV_DB_PASSWORD', ''),
+            'HOST': os.environ.get('PDV_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('PDV_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('PDV_DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('PDV_DB_PGBOUNCER') == '1',
+            'OPTIONS': {'connect_timeout': 5},
+        }
+    }
+    if os.environ.get('PDV_DB_POOL') == '1':
+        # requirements.txt traz só o psycopg2, que não tem pool
+        if not (find_spec('psycopg') and find_spec('psycopg_pool')):
+            raise ImproperlyConfigured('PDV_DB_POOL=1 exige psycopg 3 com pool: pip install "psycopg[binary,pool]"')
+        # O pool substitui as conexões persistentes
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 2,
+            'max_size': int(os.environ.get('PDV_DB_POOL_MAX_SIZE', '20')),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('PDV_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('PDV_DB_CONN_MAX_AGE', '600')),
+            'OPTIONS': {
+                # Segundos esperando o lock antes de "database is locked"
+                'timeout': 20,
+                # BEGIN IMMEDIATE: a transação pega o lock de escrita no início,
+                # em vez de falhar ao tentar promovê-lo no meio da venda
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # Banco de testes em arquivo: testes com várias threads precisam
+            # de conexões independentes (em memória o lock é por tabela)
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# PRAGMAs aplicados a cada nova conexão SQLite (pdv.signals)
+PDV_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Com vários processos/servidores, use um backend compartilhado (Redis,
+# Memcached) para que as invalidações do catálogo valham para todos.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dolphinpdv',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
 
@@ -130,3 +205,73 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Configurações do PDV
+
+# Sincronização de vendas offline: vendas por transação e máximo por requisição
+PDV_SALE_SYNC_CHUNK_SIZE = 50
+PDV_SALE_SYNC_MAX_SALES = 1000
+
+# Chaves de idempotência de vendas: horas até serem removidas por purge_idempotency_keys
+PDV_IDEMPOTENCY_KEY_TTL_HOURS = 48
+
+# Busca de produtos: resultados padrão e máximo por consulta (?limit=)
+PDV_SEARCH_LIMIT = 20
+PDV_SEARCH_MAX_LIMIT = 100
+
+# Cache de produtos por código de barras: alias em CACHES e validade (segundos)
+PDV_CACHE_ALIAS = 'default'
+PDV_BARCODE_CACHE_TIMEOUT = 300
+
+# Cache de tokens Bearer em memória: máximo de entradas e validade (segundos)
+PDV_TOKEN_CACHE_SIZE = 4096
+PDV_TOKEN_CACHE_TTL = 60
+
+# Sessões (AuthToken): duração em horas e intervalo mínimo, em segundos, entre
+# limpezas automáticas das expiradas (None desativa; use purge_auth_tokens)
+PDV_TOKEN_LIFETIME_HOURS = 8
+PDV_TOKEN_PURGE_INTERVAL = 3600
+
+# Exportações de vendas: linhas lidas do banco por vez
+PDV_EXPORT_CHUNK_SIZE = 2000
+
+# Entrada de mercadoria (/api/receipts/): máximo de itens por documento
+PDV_RECEIPT_MAX_LINES = 5000
+
+# Importação de catálogo: produtos gravados por transação e máximo de
+# rejeições detalhadas no resumo
+PDV_CATALOG_IMPORT_CHUNK_SIZE = 1000
+PDV_CATALOG_IMPORT_MAX_ERRORS = 100
+
+# Sincronização incremental do cadastro (/api/catalog/changes/): alterações
+# por página, padrão e máximo (?limit=)
+PDV_CATALOG_CHANGES_LIMIT = 1000
+PDV_CATALOG_CHANGES_MAX_LIMIT = 5000
+
+# Paginação por cursor das listagens: itens por página padrão e máximo (?limit=)
+PDV_PAGE_SIZE = 100
+PDV_MAX_PAGE_SIZE = 1000
+
+# Views assíncronas nas rotas de leitura; ligado por dolphinpdv/asgi.py
+PDV_ASYNC_VIEWS = os.environ.get('PDV_ASYNC_VIEWS') == '1'
+
+# Escritor único de vendas (group commit), para SQLite: vendas de todas as
+# threads entram em uma fila e são gravadas em lotes de até MAX_BATCH vendas
+# por transação, esperando no máximo MAX_WAIT_MS por vendas adicionais
+PDV_SALE_WRITER = os.environ.get('PDV_SALE_WRITER') == '1'
+PDV_SALE_WRITER_MAX_BATCH = 32
+PDV_SALE_WRITER_MAX_WAIT_MS = 5
+
+# Instrumentação (pdv.middleware.InstrumentationMiddleware): cabeçalho
+# Server-Timing nas respostas e aviso de N+1 quando uma requisição repete a
+# mesma consulta mais vezes que o limite (None desativa o aviso)
+PDV_SERVER_TIMING = True
+PDV_N_PLUS_ONE_THRESHOLD = 10
+
+# Perfis sob demanda (cabeçalho X-PDV-Profile: 1, só administradores):
+# diretório do buffer circular, quantos perfis manter e linhas do resumo
+PDV_PROFILING = os.environ.get('PDV_PROFILING') == '1'
+PDV_PROFILE_DIR = os.environ.get('PDV_PROFILE_DIR', BASE_DIR / 'profiles')
+PDV_PROFILE_KEEP = 50
+PDV_PROFILE_TOP = 60
@@ -6,10 +6,11 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'barcode')
+    list_display = ('name', 'category', 'price', 'barcode', 'stock', 'reorder_level')
     list_filter = ('category',)
     search_fields = ('name', 'barcode')
     raw_id_fields = ('category',)
+    readonly_fields = ('stock',)
 
 class BatchAdmin(admin.ModelAdmin):
     list_display = ('product', 'quantity', 'inclusion_date', 'expiration_date')
@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
+
+
+def create_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .search import ensure_search_index
+
+    ensure_search_index(connections[using])
+
+
+def drop_search_triggers(sender, using, plan, **kwargs):
+    from django.db import connections
+    from .search import drop_search_triggers
+
+    # Só quando há migrações a aplicar; sem elas o índice fica como está
+    if plan:
+        drop_search_triggers(connections[using])
 
 
 class PdvConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pdv'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        pre_migrate.connect(drop_search_triggers, sender=self)
+        post_migrate.connect(create_search_index, sender=self)
@@ -0,0 +1,105 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from . import catalog_cache, params, queries, versions, views
+from .models import Product
+from .pagination import InvalidCursor, apaginate
+from .rollups import sales_summary
+from .search import search_products
+
+# Versões assíncronas das rotas de leitura, usadas quando o projeto roda sob
+# ASGI (PDV_ASYNC_VIEWS). Sob uvicorn, bipagens e buscas não ficam na fila
+# atrás de relatórios demorados ocupando threads de worker.
+
+
+@csrf_exempt
+@versions.etag(versions.PRODUCTS, versions.CATEGORIES)
+async def get_products(request):
+    search = request.GET.get('search', '').strip()
+
+    if search:
+        limit = params.limit(request, settings.PDV_SEARCH_LIMIT, settings.PDV_SEARCH_MAX_LIMIT)
+        results = await sync_to_async(search_products)(search, limit)
+        return JsonResponse({'results': results, 'next_cursor': None})
+
+    try:
+        return JsonResponse(await apaginate(request, queries.products()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
+
+
+async def catalog_changes(request):
+    try:
+        since = params.since(request)
+    except ValueError:
+        return params.invalid_since()
+    limit = params.limit(request, settings.PDV_CATALOG_CHANGES_LIMIT, settings.PDV_CATALOG_CHANGES_MAX_LIMIT)
+    return JsonResponse(await sync_to_async(versions.changes_since)(since, limit))
+
+
+@csrf_exempt
+async def product_by_barcode(request, barcode=None):
+    # Escritas continuam na view síncrona
+    if request.method != 'GET':
+        return await sync_to_async(views.product_by_barcode)(request, barcode)
+
+    try:
+        return JsonResponse(await catalog_cache.aget_by_barcode(barcode))
+    except Product.DoesNotExist:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Produto não encontrado'
+        }, status=404)
+
+
+async def get_inventory(request):
+    product_id = request.GET.get('product_id')
+    try:
+        if product_id:
+            inventory = queries.inventory_batches(product_id)
+            return JsonResponse(await apaginate(request, inventory, key='batch_id', row_key='batch__id'))
+
+        return JsonResponse(await apaginate(request, queries.inventory_summary()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
+
+
+async def sales_report(request):
+    try:
+        date_from, date_to, *period = params.period(request)
+    except ValueError:
+        return params.invalid_period()
+
+    report = await sync_to_async(sales_summary)(*period)
+
+    return JsonResponse({
+        'period': {'from': date_from, 'to': date_to},
+        **report
+    })
+
+
+async def inventory_report(request):
+    return JsonResponse({
+        'low_stock': [row async for row in queries.low_stock()],
+        'expiring_soon': [row async for row in queries.expiring_soon()]
+    })
+
+
+@csrf_exempt
+@versions.etag(versions.CATEGORIES)
+async def list_categories(request):
+    try:
+        return JsonResponse(await apaginate(request, queries.categories()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
+
+
+@csrf_exempt
+@versions.etag(versions.PAYMENT_METHODS)
+async def list_payment_methods(request):
+    try:
+        return JsonResponse(await apaginate(request, queries.payment_methods()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
@@ -0,0 +1,121 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Product
+
+# Contadores do processo atual (expostos em /api/cache/stats/)
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.PDV_CACHE_ALIAS]
+
+
+def _barcode_key(barcode):
+    # Códigos de barras podem ter caracteres inválidos para memcached
+    return 'pdv:barcode:' + hashlib.md5(barcode.encode()).hexdigest()
+
+
+def _product_key(product_id):
+    return f'pdv:barcode-of:{product_id}'
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def product_payload(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': str(product.price),
+        'barcode': product.barcode,
+        'category_id': product.category_id,
+        'category_name': product.category.name
+    }
+
+
+def _entries(barcode, payload):
+    return {
+        _barcode_key(barcode): payload,
+        # Permite invalidar a entrada antiga quando o código de barras muda
+        _product_key(payload['id']): barcode,
+    }
+
+
+def get_by_barcode(barcode):
+    """
+    Produto (com nome da categoria) pelo código de barras: um acesso ao cache
+    ou, na falta, uma única consulta com select_related.
+    Levanta Product.DoesNotExist se o código não existir.
+    """
+    cache = _cache()
+    payload = cache.get(_barcode_key(barcode))
+    if payload is not None:
+        _count('hits')
+        return payload
+
+    _count('misses')
+    product = Product.objects.select_related('category').get(barcode=barcode)
+    payload = product_payload(product)
+    cache.set_many(_entries(barcode, payload), settings.PDV_BARCODE_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_by_barcode(barcode):
+    """Versão assíncrona de get_by_barcode()."""
+    cache = _cache()
+    payload = await cache.aget(_barcode_key(barcode))
+    if payload is not None:
+        _count('hits')
+        return payload
+
+    _count('misses')
+    product = await Product.objects.select_related('category').aget(barcode=barcode)
+    payload = product_payload(product)
+    await cache.aset_many(_entries(barcode, payload), settings.PDV_BARCODE_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate(products):
+    """Remove do cache as entradas de `products` (iterável de (id, barcode))."""
+    cache = _cache()
+    products = list(products)
+    if not products:
+        return
+
+    previous = cache.get_many([_product_key(product_id) for product_id, _ in products])
+    barcodes = {barcode for _, barcode in products if barcode}
+    barcodes.update(previous.values())
+    cache.delete_many(
+        [_barcode_key(barcode) for barcode in barcodes]
+        + [_product_key(product_id) for product_id, _ in products]
+    )
+    _count('invalidations', len(products))
+
+
+def invalidate_now_and_on_commit(func, *args):
+    """
+    Chama a invalidação `func` já e de novo após o commit, para que uma
+    leitura concorrente não recoloque no cache os dados anteriores à transação.
+    """
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+
+def invalidate_category(category_id):
+    invalidate(Product.objects.filter(category_id=category_id).values_list('id', 'barcode'))
+
+
+def stats():
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else None
+    return data
@@ -0,0 +1,227 @@
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from . import catalog_cache, versions
+from .models import Category, Product
+from .stock import add_to_watchlist
+
+# Importação de catálogo (ex.: tabela de preços de fornecedor): produtos com
+# name, price, barcode e category (nome da categoria), em CSV, NDJSON ou uma
+# lista JSON. A entrada é lida em streaming e gravada em blocos, então
+# arquivos de 100 mil linhas não ficam inteiros na memória.
+
+FORMATS = ('csv', 'ndjson', 'json')
+
+READ_SIZE = 64 * 1024
+
+MAX_PRICE = Decimal('99999999.99')
+
+
+class CatalogImportError(Exception):
+    """Arquivo ilegível (formato inválido ou JSON malformado)."""
+
+
+def _text_lines(stream):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    number = 0
+    try:
+        for number, line in enumerate(iter(stream.readline, b''), 1):
+            yield decoder.decode(line)
+        yield decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise CatalogImportError(f'Texto inválido na linha {number}: o arquivo deve estar em UTF-8')
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(_text_lines(stream))
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        # line_num conta só as linhas já concluídas
+        raise CatalogImportError(f'CSV inválido na linha {reader.line_num + 1}: {e}')
+
+
+def _ndjson_rows(stream):
+    for number, line in enumerate(_text_lines(stream), 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                raise CatalogImportError(f'JSON inválido na linha {number}')
+
+
+def _json_rows(stream):
+    # Lista JSON lida por partes: cada objeto é decodificado assim que completo
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer, position, started, number = '', 0, False, 0
+
+    while True:
+        chunk = stream.read(READ_SIZE)
+        try:
+            buffer = buffer[position:] + text.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise CatalogImportError(f'Texto inválido após o item {number}: o arquivo deve estar em UTF-8')
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CatalogImportError('O JSON deve ser uma lista de produtos')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise CatalogImportError(f'JSON inválido após o item {number}')
+                # Objeto incompleto: lê mais
+                break
+            number += 1
+            yield number, value
+
+        if not chunk:
+            raise CatalogImportError('JSON incompleto: lista sem "]"')
+
+
+def read_rows(stream, fmt):
+    """Itera (número da linha/item, dados) de um arquivo binário em `fmt`."""
+    if fmt not in FORMATS:
+        raise CatalogImportError('Formato deve ser csv, ndjson ou json')
+    return {'csv': _csv_rows, 'ndjson': _ndjson_rows, 'json': _json_rows}[fmt](stream)
+
+
+def _price(value):
+    text = str(value).strip()
+    if ',' in text and '.' not in text:
+        # Tabelas de preço brasileiras: 12,50
+        text = text.replace(',', '.')
+    price = Decimal(text).quantize(Decimal('0.01'))
+    if not 0 <= price <= MAX_PRICE:
+        raise InvalidOperation
+    return price
+
+
+def _clean(row):
+    if not isinstance(row, dict):
+        raise ValueError('Linha deve ser um objeto')
+
+    name = str(row.get('name') or '').strip()
+    barcode = str(row.get('barcode') or '').strip()
+    category = str(row.get('category') or row.get('category_name') or '').strip()
+    if '\x00' in name + barcode + category:
+        # O PostgreSQL recusa NUL em texto
+        raise ValueError('Caractere nulo (NUL) no texto')
+    if not name or len(name) > 100:
+        raise ValueError('Nome ausente ou com mais de 100 caracteres')
+    if not barcode or len(barcode) > 100:
+        raise ValueError('Código de barras ausente ou com mais de 100 caracteres')
+    if not category or len(category) > 100:
+        raise ValueError('Categoria ausente ou com mais de 100 caracteres')
+    try:
+        price = _price(row.get('price'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'Preço inválido: {row.get("price")!r}')
+    return name, price, barcode, category
+
+
+class CatalogImport:
+    def __init__(self, chunk_size=None, max_errors=None):
+        self.chunk_size = chunk_size or settings.PDV_CATALOG_IMPORT_CHUNK_SIZE
+        self.max_errors = settings.PDV_CATALOG_IMPORT_MAX_ERRORS if max_errors is None else max_errors
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        # Categorias resolvidas pelo nome, carregadas uma vez
+        self.categories = {}
+        for category_id, name in Category.objects.order_by('-id').values_list('id', 'name'):
+            self.categories[name] = category_id
+
+    def reject(self, number, message):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'message': message})
+
+    def run(self, rows):
+        chunk = {}
+        for number, row in rows:
+            try:
+                name, price, barcode, category = _clean(row)
+            except ValueError as e:
+                self.reject(number, str(e))
+                continue
+
+            if barcode in chunk:
+                # A mesma linha duas vezes no bloco: vale a última
+                self.reject(chunk[barcode][0], 'Código de barras repetido no arquivo; vale a última linha')
+            chunk[barcode] = (number, name, price, category)
+            if len(chunk) >= self.chunk_size:
+                self.write(chunk)
+                chunk = {}
+        if chunk:
+            self.write(chunk)
+        return self.summary()
+
+    @transaction.atomic
+    def write(self, chunk):
+        missing = {category for _, _, _, category in chunk.values()} - self.categories.keys()
+        if missing:
+            created = Category.objects.bulk_create([Category(name=name) for name in sorted(missing)])
+            for category in created:
+                self.categories[category.name] = category.id
+            versions.record(versions.CATEGORIES, [category.id for category in created])
+
+        existing = dict(Product.objects.filter(barcode__in=chunk).values_list('barcode', 'id'))
+        Product.objects.bulk_create(
+            [
+                Product(barcode=barcode, name=name, price=price, category_id=self.categories[category])
+                for barcode, (_, name, price, category) in chunk.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['barcode'],
+            update_fields=['name', 'price', 'category']
+        )
+
+        # bulk_create não dispara sinais: invalida o cache dos atualizados,
+        # põe os novos (sem estoque) na lista de estoque baixo e registra
+        # todos no log de alterações
+        catalog_cache.invalidate_now_and_on_commit(
+            catalog_cache.invalidate, [(product_id, barcode) for barcode, product_id in existing.items()]
+        )
+        ids = dict(Product.objects.filter(barcode__in=chunk).values_list('barcode', 'id'))
+        add_to_watchlist([product_id for barcode, product_id in ids.items() if barcode not in existing])
+        versions.record(versions.PRODUCTS, ids.values())
+        self.updated += len(existing)
+        self.inserted += len(chunk) - len(existing)
+
+    def summary(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'errors': self.errors,
+        }
+
+
+def import_catalog(stream, fmt, chunk_size=None):
+    """
+    Insere ou atualiza (pelo código de barras) os produtos de `stream`, em
+    transações de até `chunk_size` produtos. Devolve o resumo com inseridos,
+    atualizados e rejeitados (as primeiras PDV_CATALOG_IMPORT_MAX_ERRORS
+    rejeições vêm com a linha e o motivo).
+    """
+    return CatalogImport(chunk_size).run(read_rows(stream, fmt))
@@ -0,0 +1,129 @@
+import csv
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Sale, SaleItem
+from .rollups import day_bounds
+
+SALE_COLUMNS = [
+    'id', 'sale_datetime', 'username', 'payment_method', 'discount', 'addition', 'total_amount'
+]
+
+SALE_ITEM_COLUMNS = [
+    'id', 'sale_id', 'sale_datetime', 'username', 'payment_method',
+    'product_id', 'product_name', 'barcode', 'units', 'unit_price', 'total_price'
+]
+
+# Bytes acumulados antes de cada bloco enviado (e comprimido, com gzip)
+FLUSH_SIZE = 64 * 1024
+
+
+def _sale_row(sale):
+    return [
+        sale.id,
+        sale.sale_datetime.isoformat(),
+        sale.user.username,
+        sale.payment_method.name,
+        str(sale.discount),
+        str(sale.addition),
+        str(sale.total_amount),
+    ]
+
+
+def _sale_item_row(item):
+    return [
+        item.id,
+        item.sale_id,
+        item.sale.sale_datetime.isoformat(),
+        item.sale.user.username,
+        item.sale.payment_method.name,
+        item.product_id,
+        item.product.name,
+        item.product.barcode,
+        item.units,
+        str(item.unit_price),
+        str(item.total_price),
+    ]
+
+
+def sales_rows(date_from, date_to):
+    start, _ = day_bounds(date_from)
+    _, end = day_bounds(date_to)
+    sales = Sale.objects.filter(
+        sale_datetime__gte=start,
+        sale_datetime__lt=end
+    ).select_related('payment_method', 'user').order_by('sale_datetime', 'id')
+    for sale in sales.iterator(chunk_size=settings.PDV_EXPORT_CHUNK_SIZE):
+        yield _sale_row(sale)
+
+
+def sale_items_rows(date_from, date_to):
+    start, _ = day_bounds(date_from)
+    _, end = day_bounds(date_to)
+    items = SaleItem.objects.filter(
+        sale__sale_datetime__gte=start,
+        sale__sale_datetime__lt=end
+    ).select_related(
+        'sale__payment_method', 'sale__user', 'product'
+    ).order_by('sale__sale_datetime', 'sale_id', 'id')
+    for item in items.iterator(chunk_size=settings.PDV_EXPORT_CHUNK_SIZE):
+        yield _sale_item_row(item)
+
+
+class _Line:
+    """Buffer de uma linha para csv.writer (padrão da documentação do Django)."""
+
+    def write(self, value):
+        return value
+
+
+def _encode(rows, columns, fmt):
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns).encode()
+        for row in rows:
+            yield writer.writerow(row).encode()
+    else:
+        for row in rows:
+            yield (json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n').encode()
+
+
+def stream(rows, columns, fmt, compress=False):
+    """
+    Gera o arquivo em blocos de ~FLUSH_SIZE bytes, lendo as linhas sob
+    demanda: a memória usada não depende do tamanho do período.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = formato gzip
+    buffer = []
+    size = 0
+    for line in _encode(rows, columns, fmt):
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            block = compressor.compress(block) if compressor else block
+            if block:
+                yield block
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+async def astream(blocks):
+    """
+    Entrega os blocos de stream() a uma resposta servida sob ASGI, lendo um
+    de cada vez em thread. Com o gerador síncrono, o Django consumiria o
+    arquivo inteiro em memória antes de enviar o primeiro byte.
+    """
+    read = sync_to_async(next)
+    try:
+        while (block := await read(blocks, None)) is not None:
+            yield block
+    finally:
+        await sync_to_async(blocks.close)()
@@ -0,0 +1,172 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from pdv import versions
+from pdv.models import Batch, Category, Inventory, PaymentMethod, Product, Sale, SaleItem, User
+from pdv.rollups import rebuild_rollups
+from pdv.stock import rebuild_watchlist
+
+WORDS = (
+    'Arroz', 'Feijão', 'Açúcar', 'Café', 'Leite', 'Óleo', 'Farinha', 'Macarrão', 'Biscoito', 'Sabão',
+    'Detergente', 'Suco', 'Refrigerante', 'Água', 'Cerveja', 'Queijo', 'Presunto', 'Manteiga', 'Iogurte', 'Pão',
+)
+BRANDS = ('Bom Preço', 'Da Casa', 'Tio João', 'Boa Vista', 'Estrela', 'Sol', 'Campo Verde', 'Dolphin')
+SIZES = ('200g', '500g', '1kg', '2kg', '5kg', '350ml', '1L', '2L', 'un', 'pct')
+PAYMENT_METHODS = ('Dinheiro', 'Cartão de Débito', 'Cartão de Crédito', 'Pix')
+
+
+def ean13(number):
+    """Código EAN-13 (prefixo 789, Brasil) com dígito verificador."""
+    digits = f'789{number:09d}'
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+@contextmanager
+def historical_sale_datetime():
+    # auto_now_add sobrescreveria as datas geradas no bulk_create
+    field = Sale._meta.get_field('sale_datetime')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Gera um conjunto de dados sintético de uma loja grande (catálogo, lotes e histórico de vendas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--batches', type=int, default=3, help='Lotes por produto')
+        parser.add_argument('--sales', type=int, default=100000)
+        parser.add_argument('--max-items', type=int, default=8, help='Máximo de itens por venda')
+        parser.add_argument('--days', type=int, default=365, help='Dias de histórico de vendas')
+        parser.add_argument('--users', type=int, default=10, help='Operadores de caixa (caixa1, caixa2...)')
+        parser.add_argument('--password', default='senha123', help='Senha dos operadores criados')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas por bulk_create')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if Product.objects.filter(barcode__startswith='789').exists():
+            raise CommandError('O banco já tem produtos gerados; use um banco vazio')
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+
+        users = self.create_users(options['users'], options['password'])
+        methods = [PaymentMethod.objects.get_or_create(name=name)[0] for name in PAYMENT_METHODS]
+        categories = Category.objects.bulk_create([
+            Category(name=f'Categoria {i + 1}') for i in range(options['categories'])
+        ])
+        versions.record(versions.CATEGORIES, [category.id for category in categories])
+        self.stdout.write(f'{len(categories)} categorias')
+
+        products = self.create_products(options['products'], categories, options['batches'])
+        rebuild_watchlist()
+        self.stdout.write(f'{len(products)} produtos com {options["batches"]} lotes cada')
+
+        first_day, last_day = self.create_sales(
+            options['sales'], options['max_items'], options['days'], users, methods, products
+        )
+        self.stdout.write(f'{options["sales"]} vendas de {first_day} a {last_day}')
+
+        rebuild_rollups(first_day, last_day)
+        self.stdout.write(self.style.SUCCESS('Dados gerados e agregados diários recalculados'))
+
+    def create_users(self, count, password):
+        users = []
+        for i in range(1, count + 1):
+            username = f'caixa{i}'
+            user = User.objects.filter(username=username).first() or User.objects.create_user(
+                username, f'{username}@example.com', password, name=f'Caixa {i}'
+            )
+            users.append(user)
+        return users
+
+    def chunks(self, count):
+        for start in range(0, count, self.chunk_size):
+            yield range(start, min(count, start + self.chunk_size))
+
+    def create_products(self, count, categories, batches_per_product):
+        rng = self.rng
+        today = timezone.localdate()
+        products = []
+        for chunk in self.chunks(count):
+            with transaction.atomic():
+                quantities = {i: [rng.randint(0, 200) for _ in range(batches_per_product)] for i in chunk}
+                created = Product.objects.bulk_create([
+                    Product(
+                        name=f'{rng.choice(WORDS)} {rng.choice(BRANDS)} {rng.choice(SIZES)} #{i + 1}',
+                        category=rng.choice(categories),
+                        price=Decimal(rng.randint(99, 9999)) / 100,
+                        barcode=ean13(i + 1),
+                        stock=sum(quantities[i])
+                    )
+                    for i in chunk
+                ])
+
+                batches = Batch.objects.bulk_create([
+                    Batch(
+                        product=product,
+                        quantity=quantity,
+                        # Alguns vencidos, alguns vencendo na semana, a maioria adiante
+                        expiration_date=today + timedelta(days=rng.randint(-30, 365)) if rng.random() < 0.7 else None
+                    )
+                    for product, i in zip(created, chunk)
+                    for quantity in quantities[i]
+                ])
+                versions.record(versions.PRODUCTS, [product.id for product in created])
+                Inventory.objects.bulk_create([
+                    Inventory(product=batch.product, batch=batch, quantity=batch.quantity,
+                              expiration_date=batch.expiration_date)
+                    for batch in batches
+                ])
+            products.extend(created)
+        return products
+
+    def create_sales(self, count, max_items, days, users, methods, products):
+        rng = self.rng
+        now = timezone.now()
+        start = now - timedelta(days=days)
+        seconds = int((now - start).total_seconds())
+        # Poucos produtos concentram a maior parte das vendas
+        weights = list(accumulate(1 / (rank + 1) for rank in range(len(products))))
+
+        with historical_sale_datetime():
+            for chunk in self.chunks(count):
+                with transaction.atomic():
+                    carts = [
+                        rng.choices(products, cum_weights=weights, k=rng.randint(1, max_items))
+                        for _ in chunk
+                    ]
+                    sales = Sale.objects.bulk_create([
+                        Sale(
+                            sale_datetime=start + timedelta(seconds=rng.randrange(seconds)),
+                            user=rng.choice(users),
+                            payment_method=rng.choice(methods),
+                            total_amount=sum(product.price for product in cart)
+                        )
+                        for cart in carts
+                    ])
+                    SaleItem.objects.bulk_create([
+                        SaleItem(
+                            sale=sale,
+                            product=product,
+                            units=1,
+                            unit_price=product.price,
+                            total_price=product.price
+                        )
+                        for sale, cart in zip(sales, carts)
+                        for product in cart
+                    ], batch_size=self.chunk_size)
+
+        return timezone.localdate(start), timezone.localdate(now)
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdv.catalog_import import FORMATS, CatalogImportError, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Importa produtos (name, price, barcode, category) de CSV, NDJSON ou JSON, atualizando pelo código de barras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo a importar ("-" lê da entrada padrão)')
+        parser.add_argument('--format', choices=FORMATS, help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--chunk-size', type=int, help='Produtos por transação')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError('Informe --format (csv, ndjson ou json)')
+
+        try:
+            if path == '-':
+                summary = import_catalog(sys.stdin.buffer, fmt, options['chunk_size'])
+            else:
+                with open(path, 'rb') as stream:
+                    summary = import_catalog(stream, fmt, options['chunk_size'])
+        except (OSError, CatalogImportError) as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stdout.write(self.style.WARNING(f'Linha {error["row"]}: {error["message"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{summary["inserted"]} inserido(s), {summary["updated"]} atualizado(s), '
+            f'{summary["rejected"]} rejeitado(s)'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pdv.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Remove em lote as sessões (tokens de acesso) expiradas'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} sessão(ões) expirada(s) removida(s)'))
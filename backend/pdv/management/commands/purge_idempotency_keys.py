@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdv.sales import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Remove em lote as chaves de idempotência de vendas mais antigas que PDV_IDEMPOTENCY_KEY_TTL_HOURS'
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} chave(s) com mais de {settings.PDV_IDEMPOTENCY_KEY_TTL_HOURS}h removida(s)'
+        ))
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from pdv.models import Sale
+from pdv.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os agregados diários de vendas a partir de Sale e SaleItem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Primeiro dia (AAAA-MM-DD); padrão: primeira venda')
+        parser.add_argument('--to', dest='date_to', help='Último dia (AAAA-MM-DD); padrão: última venda')
+
+    def handle(self, *args, **options):
+        bounds = Sale.objects.aggregate(first=Min('sale_datetime'), last=Max('sale_datetime'))
+        if bounds['first'] is None and not (options['date_from'] and options['date_to']):
+            self.stdout.write('Nenhuma venda registrada')
+            return
+
+        try:
+            date_from = (date.fromisoformat(options['date_from']) if options['date_from']
+                         else timezone.localdate(bounds['first']))
+            date_to = (date.fromisoformat(options['date_to']) if options['date_to']
+                       else timezone.localdate(bounds['last']))
+        except ValueError:
+            raise CommandError('Datas devem estar no formato AAAA-MM-DD')
+
+        rebuild_rollups(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f'Agregados recalculados de {date_from} a {date_to}'))
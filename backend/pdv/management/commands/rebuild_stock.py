@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pdv.stock import find_stock_drift, rebuild_stock
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o saldo materializado dos produtos a partir do Inventory e relata divergências'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas relata as divergências, sem corrigi-las'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = find_stock_drift() if options['dry_run'] else rebuild_stock()
+
+        for product_id, stock, expected in drift:
+            self.stdout.write(f'Produto {product_id}: saldo {stock}, inventário {expected}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} produto(s) com divergência'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(drift)} produto(s) corrigido(s)'))
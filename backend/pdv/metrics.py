@@ -0,0 +1,162 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Histogramas do processo atual, por rota (nome da URL) e método, expostos em
+# formato Prometheus em /api/metrics/. Com vários workers, cada processo tem
+# os seus; o Prometheus soma as séries de cada alvo.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HISTOGRAMS = {
+    'pdv_request_duration_seconds': ('Tempo da requisição na view (inclui SQL)', DURATION_BUCKETS),
+    'pdv_db_duration_seconds': ('Tempo total de SQL por requisição', DURATION_BUCKETS),
+    'pdv_db_queries': ('Consultas ao banco por requisição', QUERY_BUCKETS),
+    'pdv_response_size_bytes': ('Tamanho do corpo da resposta', SIZE_BUCKETS),
+}
+
+# Métodos com série própria; os demais (enviados livremente pelo cliente)
+# caem em "other", para não criar séries sem limite
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+# Listas de parâmetros de tamanho variável (IN (%s, %s, ...), VALUES (...), (...))
+_PARAM_LISTS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)(?:\s*,\s*\(\s*%s(?:\s*,\s*%s)*\s*\))*')
+
+_current = ContextVar('pdv_request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_histograms = {name: {} for name in HISTOGRAMS}
+_responses = Counter()
+_lock = threading.Lock()
+
+
+def observe(name, labels, value):
+    with _lock:
+        series = _histograms[name]
+        if labels not in series:
+            series[labels] = Histogram(HISTOGRAMS[name][1])
+        series[labels].observe(value)
+
+
+def method_label(method):
+    return method if method in METHODS else 'other'
+
+
+def count_response(labels):
+    with _lock:
+        _responses[labels] += 1
+
+
+class RequestStats:
+    """Consultas da requisição atual, coletadas por collect_query()."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, sql, elapsed):
+        self.queries += 1
+        self.sql_time += elapsed
+        self.shapes[_PARAM_LISTS.sub('(...)', sql)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def collect_query(execute, sql, params, many, context):
+    """
+    execute_wrapper instalado em cada conexão (pdv.signals): fora de uma
+    requisição instrumentada só repassa a consulta.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, time.perf_counter() - start)
+
+
+def warn_repeated_queries(view, stats):
+    threshold = settings.PDV_N_PLUS_ONE_THRESHOLD
+    if threshold is None:
+        return
+    for shape, count in stats.repeated(threshold):
+        logger.warning('Possível N+1 em %s: consulta repetida %d vezes: %s', view, count, shape[:300])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Métricas no formato texto do Prometheus (version 0.0.4)."""
+    lines = []
+    with _lock:
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in sorted(_histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format(bound)
+                    lines.append(f'{name}_bucket{{{_labels(labels + (("le", le),))}}} {cumulative}')
+                lines.append(f'{name}_sum{{{_labels(labels)}}} {_format(histogram.sum)}')
+                lines.append(f'{name}_count{{{_labels(labels)}}} {histogram.count}')
+
+        lines.append('# HELP pdv_responses_total Respostas por rota, método e status')
+        lines.append('# TYPE pdv_responses_total counter')
+        for labels, count in sorted(_responses.items()):
+            lines.append(f'pdv_responses_total{{{_labels(labels)}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        for series in _histograms.values():
+            series.clear()
+        _responses.clear()
@@ -1,30 +1,188 @@
 # backend/pdv/middleware.py
 import json
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import JsonResponse
-from .models import User
+from django.utils import timezone
+from . import metrics, profiling
+from .tokens import hash_token, resolve_token, token_cache
 
 class TokenAuthMiddleware:
+    # Funciona sob WSGI e ASGI, sem forçar as views assíncronas para uma thread
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Se já tem usuário autenticado (via session), não faz nada
         if hasattr(request, 'user') and request.user.is_authenticated:
             return self.get_response(request)
-        
+
+        token = self.bearer_token(request)
+        if token:
+            error = self.authenticate(request, token, resolve_token(token))
+            if error:
+                return error
+
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if hasattr(request, 'auser') and (await request.auser()).is_authenticated:
+            return await self.get_response(request)
+
+        token = self.bearer_token(request)
+        if token:
+            # Acerto no cache de tokens não precisa sair do event loop
+            resolved = token_cache.get(hash_token(token)) or await sync_to_async(resolve_token)(token)
+            error = self.authenticate(request, token, resolved)
+            if error:
+                return error
+
+        return await self.get_response(request)
+
+    def bearer_token(self, request):
         # Verifica o token Bearer apenas para rotas API
         if request.path.startswith('/api/'):
             auth_header = request.META.get('HTTP_AUTHORIZATION', '')
             if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-                try:
-                    request.user = User.objects.get(auth_token=token)
-                    request.user.backend = 'django.contrib.auth.backends.ModelBackend'
-                    return self.get_response(request)
-                except User.DoesNotExist:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': 'Token inválido'
-                    }, status=401)
-        
-        return self.get_response(request)
\ No newline at end of file
+                return auth_header.split(' ')[1]
+        return None
+
+    def authenticate(self, request, token, resolved):
+        if resolved is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Token inválido'
+            }, status=401)
+
+        # Expiração vem junto do usuário em cache, sem consulta extra
+        user, expires = resolved
+        if expires <= timezone.now():
+            token_cache.evict(hash_token(token))
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Token expirado'
+            }, status=401)
+
+        async def auser():
+            return user
+
+        request.user = user
+        request.user.backend = 'django.contrib.auth.backends.ModelBackend'
+        request.auser = auser
+        request.auth_token = token
+        request.auth_token_expires = expires
+        return None
+
+
+class InstrumentationMiddleware:
+    """
+    Mede cada requisição: consultas ao banco, tempo de SQL, tempo da view e
+    tamanho da resposta. Envia os valores no cabeçalho Server-Timing, soma-os
+    aos histogramas por rota de /api/metrics/ e avisa no log quando a mesma
+    consulta se repete mais de PDV_N_PLUS_ONE_THRESHOLD vezes (N+1).
+
+    Consultas feitas enquanto uma resposta em streaming é enviada ficam fora
+    da contagem; o tamanho dessas respostas é medido ao fim do envio.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        labels = (('view', view), ('method', metrics.method_label(request.method)))
+
+        metrics.observe('pdv_request_duration_seconds', labels, elapsed)
+        metrics.observe('pdv_db_duration_seconds', labels, stats.sql_time)
+        metrics.observe('pdv_db_queries', labels, stats.queries)
+        metrics.count_response(labels + (('status', response.status_code),))
+        metrics.warn_repeated_queries(view, stats)
+
+        timing = [
+            f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.queries} queries"',
+            f'view;dur={elapsed * 1000:.2f}',
+        ]
+        if response.streaming:
+            content = response.streaming_content
+            response.streaming_content = (
+                self.astreamed_size(content, labels) if response.is_async
+                else self.streamed_size(content, labels)
+            )
+        else:
+            size = len(response.content)
+            metrics.observe('pdv_response_size_bytes', labels, size)
+            timing.append(f'size;desc="{size} bytes"')
+
+        if settings.PDV_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join(timing)
+        return response
+
+    def streamed_size(self, content, labels):
+        size = 0
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+        metrics.observe('pdv_response_size_bytes', labels, size)
+
+    async def astreamed_size(self, content, labels):
+        size = 0
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+        metrics.observe('pdv_response_size_bytes', labels, size)
+
+
+class ProfilingMiddleware:
+    """
+    Roda a requisição sob cProfile quando um administrador envia o cabeçalho
+    X-PDV-Profile: 1 (ver pdv.profiling). Com PDV_PROFILING desligado, o
+    Django descarta o middleware na inicialização, sem custo por requisição.
+
+    Só síncrono: sob ASGI, ligar o perfil faz as views rodarem em thread.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PDV_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profiling.wants_profile(request):
+            return profiling.profile_request(request, self.get_response)
+        return self.get_response(request)
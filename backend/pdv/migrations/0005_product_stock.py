@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 12:38
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_stock(apps, schema_editor):
+    Product = apps.get_model('pdv', 'Product')
+    Inventory = apps.get_model('pdv', 'Inventory')
+    total = Inventory.objects.filter(
+        product_id=OuterRef('pk')
+    ).values('product_id').annotate(total=Sum('quantity')).values('total')
+    Product.objects.update(stock=Coalesce(Subquery(total), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv', '0004_user_auth_token_user_token_expires'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_stock, migrations.RunPython.noop),
+    ]
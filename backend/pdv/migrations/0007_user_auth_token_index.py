@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='auth_token',
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+    ]
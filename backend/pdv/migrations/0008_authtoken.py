@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv', '0007_user_auth_token_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='auth_token',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='token_expires',
+        ),
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2 on 2026-10-18 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    Sale = apps.get_model('pdv', 'Sale')
+    SaleItem = apps.get_model('pdv', 'SaleItem')
+    DailySales = apps.get_model('pdv', 'DailySales')
+    DailyPaymentMethodSales = apps.get_model('pdv', 'DailyPaymentMethodSales')
+    DailyProductSales = apps.get_model('pdv', 'DailyProductSales')
+
+    sales = Sale.objects.annotate(date=TruncDate('sale_datetime'))
+    DailySales.objects.bulk_create([
+        DailySales(**row)
+        for row in sales.values('date').annotate(total=Sum('total_amount'), count=Count('id')).order_by()
+    ], batch_size=500)
+    DailyPaymentMethodSales.objects.bulk_create([
+        DailyPaymentMethodSales(**row)
+        for row in sales.values('date', 'payment_method_id').annotate(
+            total=Sum('total_amount'),
+            count=Count('id')
+        ).order_by()
+    ], batch_size=500)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(**row)
+        for row in SaleItem.objects.annotate(date=TruncDate('sale__sale_datetime')).values(
+            'date', 'product_id'
+        ).annotate(units=Sum('units'), total_value=Sum('total_price')).order_by()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv', '0008_authtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='sale_datetime',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='DailyPaymentMethodSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('payment_method', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='pdv.paymentmethod')),
+            ],
+            options={
+                'unique_together': {('date', 'payment_method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='pdv.product')),
+            ],
+            options={
+                'unique_together': {('date', 'product')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
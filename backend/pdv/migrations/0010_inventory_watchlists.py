@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+
+def fill_watchlists(apps, schema_editor):
+    Batch = apps.get_model('pdv', 'Batch')
+    Inventory = apps.get_model('pdv', 'Inventory')
+    Product = apps.get_model('pdv', 'Product')
+    LowStockProduct = apps.get_model('pdv', 'LowStockProduct')
+
+    Inventory.objects.update(expiration_date=Subquery(
+        Batch.objects.filter(pk=OuterRef('batch_id')).values('expiration_date')[:1]
+    ))
+
+    now = timezone.now()
+    low = Product.objects.filter(stock__lt=F('reorder_level')).values_list('pk', flat=True)
+    LowStockProduct.objects.bulk_create(
+        [LowStockProduct(product_id=product_id, since=now) for product_id in low.iterator()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv', '0009_daily_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockProduct',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='low_stock', serialize=False, to='pdv.product')),
+                ('since', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='expiration_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_level',
+            field=models.IntegerField(default=10),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiration_date'], name='pdv_inventory_expiring_idx'),
+        ),
+        migrations.RunPython(fill_watchlists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+def fill_changes(apps, schema_editor):
+    # Cadastro existente como primeira carga da sincronização incremental
+    CatalogChange = apps.get_model('pdv', 'CatalogChange')
+    CatalogVersion = apps.get_model('pdv', 'CatalogVersion')
+
+    seq, changes = 0, []
+    for kind, model in (('categories', 'Category'), ('payment_methods', 'PaymentMethod'), ('products', 'Product')):
+        for object_id in apps.get_model('pdv', model).objects.order_by('pk').values_list('pk', flat=True).iterator():
+            seq += 1
+            changes.append(CatalogChange(seq=seq, kind=kind, object_id=object_id))
+    CatalogChange.objects.bulk_create(changes, batch_size=1000)
+    CatalogVersion.objects.update_or_create(kind='changes', defaults={'version': seq})
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdv', '0011_catalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(unique=True)),
+                ('kind', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(fill_changes, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
@@ -23,8 +24,6 @@ class User(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=100, unique=True)
     email = models.EmailField(max_length=100, unique=True)
     profile_picture = models.CharField(max_length=200, blank=True, null=True)
-    auth_token = models.CharField(max_length=40, blank=True, null=True)
-    token_expires = models.DateTimeField(blank=True, null=True)
     
     # Campos necessários para o admin
     is_admin = models.BooleanField(default=False)
@@ -47,6 +46,16 @@ class User(AbstractBaseUser, PermissionsMixin):
     def has_module_perms(self, app_label):
         return self.is_admin
 
+class AuthToken(models.Model):
+    # Uma sessão por login: vários terminais podem ficar logados com o mesmo usuário
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Token de {self.user} (expira em {self.expires})"
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     
@@ -58,9 +67,23 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     barcode = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    # Saldo materializado (soma de Inventory.quantity), mantido por vendas e entradas
+    stock = models.IntegerField(default=0, db_index=True, editable=False)
+    # Ponto de reposição: abaixo dele o produto entra em LowStockProduct
+    reorder_level = models.IntegerField(default=10)
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # O saldo só muda por pdv.stock.adjust_stock (UPDATE relativo): uma
+        # edição do cadastro não regrava o valor lido antes de uma venda
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'stock'
+            ]
+        super().save(*args, **kwargs)
 
 class Batch(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
@@ -75,13 +98,31 @@ class Inventory(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     batch = models.ForeignKey(Batch, on_delete=models.PROTECT)
     quantity = models.IntegerField()
+    # Cópia de Batch.expiration_date, para o índice parcial de vencimentos
+    expiration_date = models.DateField(blank=True, null=True)
     
     class Meta:
         unique_together = ('product', 'batch')
+        indexes = [
+            # Só lotes com saldo: o relatório de vencimentos não lê os esgotados
+            models.Index(
+                fields=['expiration_date'],
+                condition=models.Q(quantity__gt=0),
+                name='pdv_inventory_expiring_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.quantity} x {self.product} (Batch {self.batch.id})"
 
+class LowStockProduct(models.Model):
+    # Produtos abaixo do ponto de reposição, mantidos por pdv.stock.adjust_stock
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='low_stock')
+    since = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.product} abaixo de {self.product.reorder_level}"
+
 class PaymentMethod(models.Model):
     name = models.CharField(max_length=100)
     
@@ -89,7 +130,7 @@ class PaymentMethod(models.Model):
         return self.name
 
 class Sale(models.Model):
-    sale_datetime = models.DateTimeField(auto_now_add=True)
+    sale_datetime = models.DateTimeField(auto_now_add=True, db_index=True)
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     addition = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -107,4 +148,72 @@ class SaleItem(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     
     def __str__(self):
-        return f"{self.units}x {self.product.name} - {self.total_price}"
\ No newline at end of file
+        return f"{self.units}x {self.product.name} - {self.total_price}"
+
+# Agregados diários das vendas, atualizados no commit de cada venda (pdv.rollups)
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date}: {self.count} vendas - {self.total}"
+
+class DailyPaymentMethodSales(models.Model):
+    date = models.DateField()
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.PROTECT)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('date', 'payment_method')
+    
+    def __str__(self):
+        return f"{self.date} - {self.payment_method}: {self.total}"
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    units = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ('date', 'product')
+    
+    def __str__(self):
+        return f"{self.date} - {self.product}: {self.units}"
+
+class CatalogVersion(models.Model):
+    # Contador de alterações por tipo de cadastro (products, categories,
+    # payment_methods): base dos ETags das listagens (pdv.versions). A linha
+    # 'changes' guarda a última sequência usada em CatalogChange
+    kind = models.CharField(max_length=30, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.kind} v{self.version}"
+
+class CatalogChange(models.Model):
+    # Última alteração de cada item do cadastro, em ordem de sequência: base
+    # da sincronização incremental dos terminais. Exclusões ficam como
+    # marcas (deleted) para que os terminais removam o item
+    seq = models.BigIntegerField(unique=True)
+    kind = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    
+    class Meta:
+        unique_together = ('kind', 'object_id')
+    
+    def __str__(self):
+        return f"#{self.seq} {self.kind} {self.object_id}{' (excluído)' if self.deleted else ''}"
+
+class IdempotencyKey(models.Model):
+    # Chave enviada pelo cliente para que reenvios da mesma venda não a dupliquem
+    key = models.CharField(max_length=100, unique=True)
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE)
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.key} -> Sale #{self.sale_id}"
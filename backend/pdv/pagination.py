@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value):
+    raw = json.dumps({'after': value}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)['after']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor('Cursor inválido')
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.PDV_PAGE_SIZE))
+    except ValueError:
+        size = settings.PDV_PAGE_SIZE
+    return max(1, min(size, settings.PDV_MAX_PAGE_SIZE))
+
+
+def _seek(request, queryset, key):
+    size = page_size(request)
+    cursor = request.GET.get('cursor')
+
+    queryset = queryset.order_by(key)
+    if cursor:
+        try:
+            queryset = queryset.filter(**{f'{key}__gt': decode_cursor(cursor)})
+        except (TypeError, ValueError):
+            raise InvalidCursor('Cursor inválido')
+    # Uma linha a mais indica se existe próxima página
+    return queryset[:size + 1], size
+
+
+def _page(rows, size, row_key):
+    has_more = len(rows) > size
+    rows = rows[:size]
+    return {
+        'results': rows,
+        'next_cursor': encode_cursor(rows[-1][row_key]) if has_more else None
+    }
+
+
+def paginate(request, queryset, key='id', row_key=None):
+    """
+    Paginação por chave (keyset): ordena por `key` (coluna indexada e única)
+    e continua a partir do último valor visto, codificado no cursor opaco
+    `?cursor=`. Qualquer página custa o mesmo que a primeira, ao contrário
+    de OFFSET.
+
+    `queryset` deve ser um .values() que inclua a chave, em `row_key`.
+    """
+    queryset, size = _seek(request, queryset, key)
+    return _page(list(queryset), size, row_key or key)
+
+
+async def apaginate(request, queryset, key='id', row_key=None):
+    """Versão assíncrona de paginate(), com o ORM assíncrono."""
+    queryset, size = _seek(request, queryset, key)
+    return _page([row async for row in queryset], size, row_key or key)
@@ -0,0 +1,48 @@
+from datetime import date, datetime, timedelta
+
+from django.http import JsonResponse
+
+# Leitura dos parâmetros de consulta das rotas de leitura e as respostas de
+# erro correspondentes, compartilhadas pelas views síncronas (pdv.views) e
+# assíncronas (pdv.async_views).
+
+
+def limit(request, default, maximum):
+    try:
+        value = int(request.GET.get('limit', default))
+    except ValueError:
+        value = default
+    return max(1, min(value, maximum))
+
+
+def invalid_cursor(error):
+    return JsonResponse({'status': 'error', 'message': str(error)}, status=400)
+
+
+def since(request):
+    """Sequência de ?since= (0 para a carga completa); ValueError se inválida."""
+    value = int(request.GET.get('since', 0))
+    if value < 0:
+        raise ValueError
+    return value
+
+
+def invalid_since():
+    return JsonResponse({'status': 'error', 'message': 'Parâmetro since inválido'}, status=400)
+
+
+def period(request):
+    """
+    Período de ?from= e ?to= (padrão: os últimos 30 dias), como
+    (from, to, data_inicial, data_final); ValueError se alguma data for inválida.
+    """
+    date_from = request.GET.get('from', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
+    date_to = request.GET.get('to', datetime.now().strftime('%Y-%m-%d'))
+    return date_from, date_to, date.fromisoformat(date_from), date.fromisoformat(date_to)
+
+
+def invalid_period():
+    return JsonResponse({
+        'status': 'error',
+        'message': 'Datas devem estar no formato AAAA-MM-DD'
+    }, status=400)
@@ -0,0 +1,104 @@
+import cProfile
+import io
+import json
+import pstats
+import re
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+# Perfis sob demanda (pdv.middleware.ProfilingMiddleware): com PDV_PROFILING
+# ligado, um administrador envia o cabeçalho X-PDV-Profile: 1 e a requisição
+# roda sob cProfile. Cada perfil fica em PDV_PROFILE_DIR como três arquivos:
+#   <id>.json  metadados (rota, método, status, duração...)
+#   <id>.prof  pstats binário (python -m pstats, snakeviz)
+#   <id>.txt   resumo ordenado por tempo acumulado
+# Só os PDV_PROFILE_KEEP perfis mais recentes são mantidos.
+
+PROFILE_HEADER = 'X-PDV-Profile'
+PROFILE_ID_HEADER = 'X-PDV-Profile-Id'
+
+_PROFILE_ID = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+
+def _directory():
+    directory = Path(settings.PDV_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def wants_profile(request):
+    """Só administradores autenticados podem pedir o perfil de uma requisição."""
+    if request.headers.get(PROFILE_HEADER) != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_authenticated and getattr(user, 'is_admin', False))
+
+
+def profile_request(request, get_response):
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    response = profiler.runcall(get_response, request)
+    elapsed = time.perf_counter() - start
+
+    response[PROFILE_ID_HEADER] = save_profile(profiler, request, response, elapsed)
+    return response
+
+
+def save_profile(profiler, request, response, elapsed):
+    directory = _directory()
+    profile_id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+    match = request.resolver_match
+
+    profiler.dump_stats(directory / f'{profile_id}.prof')
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(settings.PDV_PROFILE_TOP)
+    (directory / f'{profile_id}.txt').write_text(summary.getvalue())
+
+    # Os metadados são gravados por último: servem de índice do buffer
+    (directory / f'{profile_id}.json').write_text(json.dumps({
+        'id': profile_id,
+        'view': match.view_name if match else 'unmatched',
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2),
+        'user': request.user.username,
+        'created': timezone.now().isoformat(),
+    }))
+    _trim(directory)
+    return profile_id
+
+
+def _trim(directory):
+    # Buffer circular: remove os perfis mais antigos além de PDV_PROFILE_KEEP
+    indexes = sorted(directory.glob('*.json'), key=lambda path: int(path.stem.split('-')[0]))
+    for index in indexes[:max(0, len(indexes) - settings.PDV_PROFILE_KEEP)]:
+        for suffix in ('.json', '.prof', '.txt'):
+            index.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Metadados dos perfis guardados, do mais recente ao mais antigo."""
+    directory = Path(settings.PDV_PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for index in directory.glob('*.json'):
+        try:
+            profiles.append(json.loads(index.read_text()))
+        except (OSError, ValueError):
+            # Removido ou ainda sendo gravado por outra requisição
+            continue
+    return sorted(profiles, key=lambda profile: int(profile['id'].split('-')[0]), reverse=True)
+
+
+def profile_path(profile_id, suffix):
+    """Caminho de um arquivo do perfil, ou None se o id for inválido ou não existir."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = Path(settings.PDV_PROFILE_DIR) / f'{profile_id}{suffix}'
+    return path if path.is_file() else None
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Category, Inventory, LowStockProduct, PaymentMethod, Product
+from .search import PRODUCT_FIELDS
+
+# Querysets das rotas de leitura, compartilhados pelas views síncronas
+# (pdv.views) e assíncronas (pdv.async_views)
+
+
+def products():
+    return Product.objects.values(*PRODUCT_FIELDS)
+
+
+def inventory_batches(product_id):
+    return Inventory.objects.filter(
+        product_id=product_id,
+        quantity__gt=0
+    ).values(
+        'batch__id',
+        'batch__inclusion_date',
+        'batch__expiration_date',
+        'quantity'
+    )
+
+
+def inventory_summary():
+    # Saldo materializado em Product.stock
+    return Product.objects.filter(
+        stock__gt=0
+    ).values('id', 'name', total_quantity=F('stock'))
+
+
+def low_stock():
+    # Produtos abaixo do ponto de reposição, pela lista mantida a cada venda e entrada
+    return LowStockProduct.objects.values(
+        'product_id',
+        'product__name',
+        'product__reorder_level',
+        total=F('product__stock')
+    ).order_by('product__stock', 'product_id')
+
+
+def expiring_soon():
+    # Lotes com saldo vencendo nos próximos 7 dias (índice parcial de Inventory)
+    today = timezone.localdate()
+    return Inventory.objects.filter(
+        quantity__gt=0,
+        expiration_date__lte=today + timedelta(days=7),
+        expiration_date__gte=today
+    ).values(
+        'product__name',
+        'expiration_date'
+    ).annotate(
+        quantity=Sum('quantity')
+    ).order_by('expiration_date')
+
+
+def categories():
+    return Category.objects.values('id', 'name')
+
+
+def payment_methods():
+    return PaymentMethod.objects.values('id', 'name')
@@ -0,0 +1,174 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import DailyPaymentMethodSales, DailyProductSales, DailySales, Sale, SaleItem
+from .upserts import increment
+
+
+def record_sale(sale, sale_items):
+    """Acrescenta a venda aos agregados do dia (três consultas, qualquer que seja o carrinho)."""
+    date = timezone.localdate(sale.sale_datetime)
+
+    products = defaultdict(lambda: [0, 0])
+    for item in sale_items:
+        products[item.product_id][0] += item.units
+        products[item.product_id][1] += item.total_price
+
+    increment(DailySales, ['date'], ['total', 'count'], [(date, sale.total_amount, 1)])
+    increment(
+        DailyPaymentMethodSales,
+        ['date', 'payment_method'],
+        ['total', 'count'],
+        [(date, sale.payment_method_id, sale.total_amount, 1)]
+    )
+    increment(
+        DailyProductSales,
+        ['date', 'product'],
+        ['units', 'total_value'],
+        [(date, product_id, units, value) for product_id, (units, value) in products.items()]
+    )
+
+
+def day_bounds(date):
+    """Início do dia e do dia seguinte, no fuso atual: filtros por faixa usam o índice de sale_datetime."""
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rebuild_rollups(date_from, date_to):
+    """Recalcula os agregados de cada dia do intervalo a partir de Sale e SaleItem."""
+    day = date_from
+    while day <= date_to:
+        start, end = day_bounds(day)
+        with transaction.atomic():
+            DailySales.objects.filter(date=day).delete()
+            DailyPaymentMethodSales.objects.filter(date=day).delete()
+            DailyProductSales.objects.filter(date=day).delete()
+
+            sales = Sale.objects.filter(sale_datetime__gte=start, sale_datetime__lt=end)
+            summary = sales.aggregate(total=Sum('total_amount'), count=Count('id'))
+            if summary['count']:
+                DailySales.objects.create(date=day, **summary)
+                DailyPaymentMethodSales.objects.bulk_create([
+                    DailyPaymentMethodSales(date=day, **row)
+                    for row in sales.values('payment_method_id').annotate(
+                        total=Sum('total_amount'),
+                        count=Count('id')
+                    ).order_by()
+                ])
+                DailyProductSales.objects.bulk_create([
+                    DailyProductSales(date=day, **row)
+                    for row in SaleItem.objects.filter(
+                        sale__sale_datetime__gte=start,
+                        sale__sale_datetime__lt=end
+                    ).values('product_id').annotate(
+                        units=Sum('units'),
+                        total_value=Sum('total_price')
+                    ).order_by()
+                ], batch_size=500)
+        day += timedelta(days=1)
+
+
+CENTS = Decimal('0.01')
+
+
+def _money(rows, *fields):
+    # Somas no SQLite perdem a escala (Decimal('24')); padroniza em centavos
+    for row in rows:
+        for field in fields:
+            row[field] = Decimal(row[field] or 0).quantize(CENTS)
+    return rows
+
+
+def _merge(rows, key, fields):
+    merged = {}
+    for row in rows:
+        current = merged.setdefault(row[key], dict.fromkeys(fields, 0))
+        for field in fields:
+            current[field] += row[field] or 0
+    return merged
+
+
+def sales_summary(date_from, date_to, top=10):
+    """
+    Dados do relatório de vendas. Dias já encerrados vêm dos agregados
+    diários; só o dia corrente (se estiver no intervalo) é lido de Sale e
+    SaleItem, por faixa de sale_datetime.
+    """
+    today = timezone.localdate()
+    closed = dict(date__gte=date_from, date__lte=min(date_to, today - timedelta(days=1)))
+    includes_today = date_from <= today <= date_to
+
+    # Vendas por período
+    sales_by_date = [
+        {'sale_datetime__date': row['date'], 'total': row['total'], 'count': row['count']}
+        for row in DailySales.objects.filter(**closed).order_by('date').values('date', 'total', 'count')
+    ]
+
+    # Métodos de pagamento
+    payment_rows = list(
+        DailyPaymentMethodSales.objects.filter(**closed).values('payment_method__name').annotate(
+            total=Sum('total'),
+            count=Sum('count')
+        ).order_by()
+    )
+
+    # Produtos mais vendidos
+    product_rollups = DailyProductSales.objects.filter(**closed).values('product__name').annotate(
+        total_units=Sum('units'),
+        total_value=Sum('total_value')
+    ).order_by('-total_value')
+
+    if not includes_today:
+        return {
+            'sales_by_date': sales_by_date,
+            'payment_methods': _money(payment_rows, 'total'),
+            'top_products': _money(list(product_rollups[:top]), 'total_value'),
+        }
+
+    start, end = day_bounds(today)
+    today_sales = Sale.objects.filter(sale_datetime__gte=start, sale_datetime__lt=end)
+    summary = today_sales.aggregate(total=Sum('total_amount'), count=Count('id'))
+    if summary['count']:
+        sales_by_date.append({'sale_datetime__date': today, **summary})
+
+    payment_rows += list(
+        today_sales.values('payment_method__name').annotate(
+            total=Sum('total_amount'),
+            count=Count('id')
+        ).order_by()
+    )
+    payments = _merge(payment_rows, 'payment_method__name', ['total', 'count'])
+
+    today_items = SaleItem.objects.filter(sale__sale_datetime__gte=start, sale__sale_datetime__lt=end)
+    today_products = list(
+        today_items.values('product__name').annotate(
+            total_units=Sum('units'),
+            total_value=Sum('total_price')
+        ).order_by()
+    )
+    # Top exato sem agregar o período inteiro em Python: fora dos produtos
+    # vendidos hoje, os candidatos estão entre os `top + len(hoje)` primeiros
+    # dos agregados; os vendidos hoje entram com o total completo.
+    candidates = list(product_rollups[:top + len(today_products)])
+    candidates += list(product_rollups.filter(product__name__in=today_items.values('product__name')))
+    candidates = list({row['product__name']: row for row in candidates}.values())
+    products = _merge(candidates + today_products, 'product__name', ['total_units', 'total_value'])
+    top_products = sorted(
+        ({'product__name': name, **values} for name, values in products.items()),
+        key=lambda row: row['total_value'],
+        reverse=True
+    )[:top]
+
+    return {
+        'sales_by_date': _money(sales_by_date, 'total'),
+        'payment_methods': _money([
+            {'payment_method__name': name, **values} for name, values in payments.items()
+        ], 'total'),
+        'top_products': _money(top_products, 'total_value'),
+    }
@@ -0,0 +1,288 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import IdempotencyKey, Inventory, PaymentMethod, Product, Sale, SaleItem, User
+from .rollups import record_sale
+from .stock import adjust_stock
+
+
+class SaleError(Exception):
+    """Venda rejeitada por dados inválidos (produto inexistente, quantidade inválida...)."""
+
+
+def sale_response(sale):
+    return {
+        'status': 'success',
+        'sale_id': sale.id,
+        'total': sale.total_amount
+    }
+
+
+def stored_response(idempotency_key):
+    """Resposta original da venda registrada com esta chave, ou None."""
+    return IdempotencyKey.objects.filter(
+        key=idempotency_key
+    ).values_list('response', flat=True).first()
+
+
+def validate_idempotency_key(idempotency_key):
+    if idempotency_key is None:
+        return None
+    if not isinstance(idempotency_key, (str, int)):
+        raise SaleError('Chave de idempotência inválida')
+    idempotency_key = str(idempotency_key)
+    if not idempotency_key or len(idempotency_key) > 100:
+        raise SaleError('Chave de idempotência inválida')
+    return idempotency_key
+
+
+def purge_idempotency_keys(now=None):
+    """Remove em lote as chaves mais antigas que PDV_IDEMPOTENCY_KEY_TTL_HOURS."""
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.PDV_IDEMPOTENCY_KEY_TTL_HOURS)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def _to_decimal(value):
+    return Decimal(str(value or 0))
+
+
+def _normalize_items(items):
+    if not items:
+        raise SaleError('A venda não possui itens')
+
+    lines = []
+    for item in items:
+        product_id = int(item['product_id'])
+        quantity = int(item['quantity'])
+        if quantity <= 0:
+            raise SaleError(f'Quantidade inválida para o produto {product_id}')
+        lines.append((product_id, quantity))
+    return lines
+
+
+def _lock_products(product_ids):
+    # Trava as linhas dos produtos sempre em ordem de id: duas vendas com os
+    # mesmos produtos esperam uma pela outra em vez de entrar em deadlock
+    return {
+        product.pk: product
+        for product in Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+    }
+
+
+def _load_fifo_stock(product_ids):
+    # Todos os lotes com saldo dos produtos da venda, já na ordem FIFO, em uma
+    # consulta; lotes zerados ficam de fora
+    stock = defaultdict(list)
+    inventories = Inventory.objects.select_for_update(of=('self',)).filter(
+        product_id__in=product_ids,
+        quantity__gt=0
+    ).order_by('product_id', 'batch__inclusion_date', 'batch_id')
+    for inventory in inventories:
+        stock[inventory.product_id].append(inventory)
+    return stock
+
+
+def _consume_fifo(stock, product_id, quantity, taken):
+    remaining = quantity
+    for inventory in stock[product_id]:
+        if remaining == 0:
+            break
+        amount = min(inventory.quantity, remaining)
+        if amount:
+            inventory.quantity -= amount
+            taken[inventory.pk] += amount
+            remaining -= amount
+
+
+def _decrement_inventory(taken):
+    """
+    Baixa os lotes em um único UPDATE com F(), condicionado a cada lote ainda
+    ter o saldo lido. Se algum lote não tiver, a venda é rejeitada em vez de
+    deixar o estoque negativo.
+    """
+    condition = Q()
+    for inventory_id, amount in taken.items():
+        condition |= Q(pk=inventory_id, quantity__gte=amount)
+
+    change = Case(
+        *[When(pk=inventory_id, then=Value(amount)) for inventory_id, amount in taken.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    updated = Inventory.objects.filter(condition).update(quantity=F('quantity') - change)
+    if updated != len(taken):
+        raise SaleError('Estoque alterado por outra venda; tente novamente')
+
+
+def commit_sale(user, payment_method, items, discount=0, addition=0, idempotency_key=None):
+    """
+    Registra uma venda completa em uma única transação.
+
+    Com `idempotency_key`, a resposta da venda é gravada na mesma transação;
+    um reenvio concorrente com a mesma chave falha com IntegrityError e não
+    duplica a venda.
+
+    Os produtos e lotes da venda ficam travados (select_for_update) até o
+    fim da transação, e uma quantidade maior que o saldo disponível rejeita a
+    venda com SaleError.
+
+    O número de consultas é fixo, independente do tamanho do carrinho: uma
+    para os produtos, uma para os lotes, uma para a venda, um bulk insert dos
+    itens, um UPDATE condicional dos lotes consumidos, um UPDATE do saldo
+    materializado dos produtos, um INSERT na lista de estoque baixo e três
+    upserts nos agregados diários.
+    """
+    lines = _normalize_items(items)
+    discount = _to_decimal(discount)
+    addition = _to_decimal(addition)
+
+    with transaction.atomic():
+        product_ids = {product_id for product_id, _ in lines}
+        products = _lock_products(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise SaleError(f'Produto não encontrado: {", ".join(map(str, missing))}')
+
+        stock = _load_fifo_stock(product_ids)
+        taken = defaultdict(int)
+        consumed = defaultdict(int)
+        sale_items = []
+        total = Decimal('0')
+
+        for product_id, quantity in lines:
+            product = products[product_id]
+            available = sum(inventory.quantity for inventory in stock[product_id])
+            if quantity > available:
+                raise SaleError(f'Estoque insuficiente para {product.name}: disponível {available}')
+            _consume_fifo(stock, product_id, quantity, taken)
+            item_total = product.price * quantity
+            sale_items.append(SaleItem(
+                product=product,
+                units=quantity,
+                unit_price=product.price,
+                total_price=item_total
+            ))
+            consumed[product_id] -= quantity
+            total += item_total
+
+        sale = Sale.objects.create(
+            user=user,
+            payment_method=payment_method,
+            discount=discount,
+            addition=addition,
+            total_amount=total - discount + addition
+        )
+
+        for sale_item in sale_items:
+            sale_item.sale = sale
+        SaleItem.objects.bulk_create(sale_items)
+
+        _decrement_inventory(taken)
+        adjust_stock(consumed)
+
+        record_sale(sale, sale_items)
+
+        if idempotency_key:
+            IdempotencyKey.objects.create(
+                key=idempotency_key,
+                sale=sale,
+                response=sale_response(sale)
+            )
+
+    return sale
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sale_header(payload):
+    """
+    Chave de idempotência, usuário e forma de pagamento de uma venda do lote,
+    validados antes das buscas em lote: um campo com lista ou objeto
+    rejeita só a sua venda.
+    """
+    idempotency_key = validate_idempotency_key(payload.get('idempotency_key'))
+    username = payload.get('username')
+    if username is not None and not isinstance(username, str):
+        raise SaleError('Usuário inválido')
+    return idempotency_key, username, _as_int(payload.get('payment_method_id'))
+
+
+def _chunks(sequence, size):
+    for start in range(0, len(sequence), size):
+        yield start, sequence[start:start + size]
+
+
+def commit_sales(payloads, chunk_size):
+    """
+    Registra um lote de vendas (ex.: vendas offline de um terminal) em
+    transações de até `chunk_size` vendas. Cada venda roda em um savepoint
+    próprio, então uma venda inválida não desfaz as demais.
+
+    Devolve um resultado por venda, na mesma ordem de `payloads`.
+    """
+    headers = []
+    for payload in payloads:
+        try:
+            headers.append(_sale_header(payload))
+        except SaleError as e:
+            headers.append(e)
+    valid = [header for header in headers if not isinstance(header, SaleError)]
+
+    users = User.objects.in_bulk({username for _, username, _ in valid} - {None}, field_name='username')
+    methods = PaymentMethod.objects.in_bulk({method_id for _, _, method_id in valid} - {None})
+    keys = {key for key, _, _ in valid} - {None}
+    replays = dict(
+        IdempotencyKey.objects.filter(key__in=keys).values_list('key', 'response')
+    ) if keys else {}
+
+    results = []
+    for start, chunk in _chunks(payloads, chunk_size):
+        with transaction.atomic():
+            for index, payload in enumerate(chunk, start):
+                try:
+                    if isinstance(headers[index], SaleError):
+                        raise headers[index]
+                    idempotency_key, username, method_id = headers[index]
+                    if idempotency_key in replays:
+                        results.append(dict(replays[idempotency_key], index=index, replayed=True))
+                        continue
+
+                    user = users.get(username)
+                    if user is None:
+                        raise SaleError('Usuário não encontrado')
+                    payment_method = methods.get(method_id)
+                    if payment_method is None:
+                        raise SaleError('Método de pagamento não encontrado')
+
+                    sale = commit_sale(
+                        user,
+                        payment_method,
+                        payload.get('items'),
+                        discount=payload.get('discount', 0),
+                        addition=payload.get('addition', 0),
+                        idempotency_key=idempotency_key
+                    )
+                    response = sale_response(sale)
+                    if idempotency_key:
+                        replays[idempotency_key] = response
+                    results.append(dict(response, index=index))
+                except Exception as e:
+                    results.append({
+                        'index': index,
+                        'status': 'error',
+                        'message': str(e)
+                    })
+    return results
@@ -0,0 +1,150 @@
+import re
+
+from django.db import connection
+
+from .models import Product
+
+FTS_TABLE = 'pdv_product_fts'
+
+# Índice FTS5 (SQLite) mantido por triggers, então vale também para o admin,
+# bulk_create e SQL direto. O UPDATE só dispara quando nome, código de barras
+# ou categoria mudam: baixas de estoque (Product.stock) não reindexam.
+SQLITE_TABLE_SQL = f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, barcode, category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)"""
+
+SQLITE_FILL_SQL = f"""INSERT INTO {FTS_TABLE} (rowid, name, barcode, category)
+    SELECT p.id, p.name, COALESCE(p.barcode, ''), c.name
+    FROM pdv_product p JOIN pdv_category c ON c.id = p.category_id"""
+
+SQLITE_TRIGGERS = {
+    'pdv_product_fts_insert': f"""CREATE TRIGGER IF NOT EXISTS pdv_product_fts_insert
+        AFTER INSERT ON pdv_product BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, barcode, category)
+            VALUES (new.id, new.name, COALESCE(new.barcode, ''),
+                    (SELECT name FROM pdv_category WHERE id = new.category_id));
+        END""",
+    'pdv_product_fts_update': f"""CREATE TRIGGER IF NOT EXISTS pdv_product_fts_update
+        AFTER UPDATE OF name, barcode, category_id ON pdv_product BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+            INSERT INTO {FTS_TABLE} (rowid, name, barcode, category)
+            VALUES (new.id, new.name, COALESCE(new.barcode, ''),
+                    (SELECT name FROM pdv_category WHERE id = new.category_id));
+        END""",
+    'pdv_product_fts_delete': f"""CREATE TRIGGER IF NOT EXISTS pdv_product_fts_delete
+        AFTER DELETE ON pdv_product BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        END""",
+    'pdv_category_fts_update': f"""CREATE TRIGGER IF NOT EXISTS pdv_category_fts_update
+        AFTER UPDATE OF name ON pdv_category BEGIN
+            UPDATE {FTS_TABLE} SET category = new.name
+            WHERE rowid IN (SELECT id FROM pdv_product WHERE category_id = new.id);
+        END""",
+}
+
+# No PostgreSQL os índices trigram ficam nas próprias tabelas e são
+# mantidos pelo banco; ILIKE '%termo%' passa a usar o índice GIN.
+POSTGRESQL_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS pdv_product_name_trgm ON pdv_product USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS pdv_product_barcode_trgm ON pdv_product USING gin (barcode gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS pdv_category_name_trgm ON pdv_category USING gin (name gin_trgm_ops)',
+]
+
+PRODUCT_FIELDS = ('id', 'name', 'price', 'barcode', 'category__name')
+
+
+def drop_search_triggers(db):
+    """
+    Remove os triggers do índice no SQLite antes de um migrate. Ao recriar
+    pdv_product, o SQLite renomeia a tabela nova e valida os triggers que a
+    referenciam (pdv_category_fts_update falharia); ensure_search_index()
+    os recria e reconstrói o índice no post_migrate.
+    """
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        for name in SQLITE_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def ensure_search_index(db):
+    """
+    Cria o índice de busca de produtos, se necessário. Chamado após cada
+    migrate: no SQLite, migrações que recriam pdv_product descartam os
+    triggers, então o índice é reconstruído sempre que algum estiver faltando.
+    """
+    if 'pdv_product' not in db.introspection.table_names():
+        return
+
+    with db.cursor() as cursor:
+        if db.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            if SQLITE_TRIGGERS.keys() <= {row[0] for row in cursor.fetchall()}:
+                return
+            cursor.execute(SQLITE_TABLE_SQL)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(SQLITE_FILL_SQL)
+            for statement in SQLITE_TRIGGERS.values():
+                cursor.execute(statement)
+        elif db.vendor == 'postgresql':
+            for statement in POSTGRESQL_INDEX_SQL:
+                cursor.execute(statement)
+
+
+def _sqlite_ids(term, limit):
+    # Cada palavra vira um prefixo ("arr"* "tio"*): resultados já na digitação
+    tokens = re.findall(r'\w+', term)
+    if not tokens:
+        return []
+    query = ' '.join(f'"{token}"*' for token in tokens)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT rowid FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH %s
+                ORDER BY barcode = %s DESC, bm25({FTS_TABLE}, 10.0, 5.0, 1.0)
+                LIMIT %s""",
+            [query, term, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgresql_ids(term, limit):
+    # Código de barras exato primeiro; sem NULLS LAST os produtos sem código
+    # (NULL) viriam antes dele no DESC
+    pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT p.id FROM pdv_product p
+               WHERE p.name ILIKE %s
+                  OR p.barcode LIKE %s
+                  OR p.category_id IN (SELECT id FROM pdv_category WHERE name ILIKE %s)
+               ORDER BY (p.barcode = %s) DESC NULLS LAST, similarity(p.name, %s) DESC, p.id
+               LIMIT %s""",
+            [pattern, pattern, pattern, term, term, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ids(term, limit):
+    return list(Product.objects.filter(name__icontains=term).values_list('id', flat=True)[:limit])
+
+
+def search_product_ids(term, limit):
+    """IDs dos produtos que casam com `term` (nome, código de barras ou categoria), por relevância."""
+    if connection.vendor == 'sqlite':
+        return _sqlite_ids(term, limit)
+    if connection.vendor == 'postgresql':
+        return _postgresql_ids(term, limit)
+    return _fallback_ids(term, limit)
+
+
+def search_products(term, limit):
+    ids = search_product_ids(term, limit)
+    if not ids:
+        return []
+    rows = Product.objects.filter(id__in=ids).values(*PRODUCT_FIELDS)
+    position = {product_id: index for index, product_id in enumerate(ids)}
+    return sorted(rows, key=lambda row: position[row['id']])
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog_cache, metrics, versions
+from .models import Batch, Category, Inventory, PaymentMethod, Product, User
+from .stock import add_to_watchlist, refresh_watchlist
+from .tokens import token_cache
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    catalog_cache.invalidate_now_and_on_commit(catalog_cache.invalidate, [(instance.id, instance.barcode)])
+
+
+@receiver(post_save, sender=Product)
+def update_watchlist(sender, instance, created, **kwargs):
+    # Produto novo (sem estoque) ou com ponto de reposição alterado
+    if created:
+        add_to_watchlist([instance.pk])
+    else:
+        refresh_watchlist([instance.pk])
+
+
+@receiver(post_save, sender=Batch)
+def copy_batch_expiration(sender, instance, created, **kwargs):
+    # Inventory.expiration_date é cópia da validade do lote (índice de
+    # vencimentos); um lote novo ainda não tem linhas de inventário
+    if not created:
+        Inventory.objects.filter(batch=instance).update(expiration_date=instance.expiration_date)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_cache(sender, instance, created, **kwargs):
+    if not created:
+        catalog_cache.invalidate_now_and_on_commit(catalog_cache.invalidate_category, instance.id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=PaymentMethod)
+def record_catalog_change(sender, instance, **kwargs):
+    versions.record(versions.KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=PaymentMethod)
+def record_catalog_deletion(sender, instance, **kwargs):
+    versions.record(versions.KINDS[sender], [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=User)
+def evict_cached_tokens(sender, instance, **kwargs):
+    # Edições do usuário (ex.: desativação) invalidam os tokens em cache
+    token_cache.evict_user(instance.pk)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    # WAL permite leituras durante a escrita de uma venda; NORMAL só
+    # sincroniza o disco nos checkpoints, seguro em modo WAL
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.PDV_SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+@receiver(connection_created)
+def install_query_collector(sender, connection, **kwargs):
+    # O mesmo wrapper de conexão é reaproveitado a cada reconexão
+    if metrics.collect_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.collect_query)
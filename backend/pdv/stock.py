@@ -0,0 +1,201 @@
+from collections import defaultdict
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Batch, Inventory, LowStockProduct, Product
+
+# Produtos travados e corrigidos por transação em rebuild_stock
+REBUILD_CHUNK_SIZE = 500
+
+
+class ReceiptError(Exception):
+    """Entrada de mercadoria rejeitada (produto inexistente, quantidade ou validade inválida...)."""
+
+
+def adjust_stock(deltas):
+    """
+    Aplica variações ao saldo materializado (Product.stock) de vários
+    produtos em um único UPDATE. `deltas` é um dict {product_id: variação}.
+
+    A lista de estoque baixo acompanha na mesma transação: saídas podem
+    incluir produtos nela e entradas, retirá-los (uma consulta para cada).
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+
+    change = Case(
+        *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    updated = Product.objects.filter(pk__in=deltas).update(stock=F('stock') + change)
+
+    add_to_watchlist([product_id for product_id, delta in deltas.items() if delta < 0])
+    remove_from_watchlist([product_id for product_id, delta in deltas.items() if delta > 0])
+    return updated
+
+
+def add_to_watchlist(product_ids=None):
+    """
+    Inclui em LowStockProduct os produtos (todos, se `product_ids` for None)
+    abaixo do ponto de reposição, em um INSERT ... SELECT. Os que já estão
+    na lista mantêm a data de entrada.
+    """
+    if product_ids is not None and not product_ids:
+        return
+
+    quote = connection.ops.quote_name
+    watchlist = quote(LowStockProduct._meta.db_table)
+    product = quote(Product._meta.db_table)
+    sql = (
+        f"INSERT INTO {watchlist} ({quote('product_id')}, {quote('since')}) "
+        f"SELECT {quote('id')}, %s FROM {product} "
+        f"WHERE {quote('stock')} < {quote('reorder_level')}"
+    )
+    params = [timezone.now()]
+    if product_ids is not None:
+        sql += f" AND {quote('id')} IN ({', '.join(['%s'] * len(product_ids))})"
+        params += list(product_ids)
+    sql += f" ON CONFLICT ({quote('product_id')}) DO NOTHING"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def remove_from_watchlist(product_ids):
+    """Retira de LowStockProduct os produtos de `product_ids` que voltaram ao ponto de reposição."""
+    if product_ids:
+        LowStockProduct.objects.filter(
+            product_id__in=product_ids,
+            product__stock__gte=F('product__reorder_level')
+        ).delete()
+
+
+def refresh_watchlist(product_ids):
+    """Reavalia os produtos de `product_ids` (ex.: ponto de reposição alterado)."""
+    remove_from_watchlist(product_ids)
+    add_to_watchlist(product_ids)
+
+
+def rebuild_watchlist():
+    """Recria LowStockProduct a partir dos saldos atuais."""
+    LowStockProduct.objects.exclude(product__stock__lt=F('product__reorder_level')).delete()
+    add_to_watchlist()
+
+
+def _inventory_totals(product_ids=None):
+    totals = Inventory.objects.values('product_id')
+    if product_ids is not None:
+        totals = totals.filter(product_id__in=product_ids)
+    return dict(totals.annotate(total=Sum('quantity')).values_list('product_id', 'total'))
+
+
+def _drift(stocks, actual):
+    return [
+        (product_id, stock, actual.get(product_id) or 0)
+        for product_id, stock in stocks
+        if stock != (actual.get(product_id) or 0)
+    ]
+
+
+def find_stock_drift():
+    """
+    Compara Product.stock com a soma de Inventory e devolve a lista de
+    (product_id, saldo_materializado, saldo_real) divergentes.
+    """
+    actual = _inventory_totals()
+    return _drift(Product.objects.values_list('id', 'stock').iterator(chunk_size=2000), actual)
+
+
+def rebuild_stock():
+    """
+    Corrige os saldos divergentes e devolve a lista de divergências encontradas.
+
+    Os produtos divergentes são relidos com as linhas travadas, em ordem de
+    id como nas vendas, antes da correção: uma venda concluída depois da
+    busca não vira divergência falsa nem tem a baixa desfeita.
+    """
+    candidates = [product_id for product_id, _, _ in find_stock_drift()]
+    drift = []
+    for start in range(0, len(candidates), REBUILD_CHUNK_SIZE):
+        product_ids = candidates[start:start + REBUILD_CHUNK_SIZE]
+        with transaction.atomic():
+            stocks = list(
+                Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('id', 'stock')
+            )
+            found = _drift(stocks, _inventory_totals(product_ids))
+            Product.objects.bulk_update(
+                [Product(pk=product_id, stock=expected) for product_id, _, expected in found], ['stock']
+            )
+        drift += found
+    rebuild_watchlist()
+    return drift
+
+
+def _receipt_lines(lines):
+    if not isinstance(lines, list) or not lines:
+        raise ReceiptError('A entrada não possui itens')
+
+    parsed = []
+    for number, line in enumerate(lines, 1):
+        try:
+            if not isinstance(line, dict):
+                raise ValueError
+            quantity = int(line['quantity'])
+            expiration = line.get('expiration_date')
+            expiration = date.fromisoformat(expiration) if expiration else None
+            product_id = line.get('product_id')
+            barcode = line.get('barcode')
+            product_id = int(product_id) if product_id is not None else None
+        except (KeyError, TypeError, ValueError):
+            raise ReceiptError(f'Item {number} inválido')
+        if quantity <= 0:
+            raise ReceiptError(f'Quantidade inválida no item {number}')
+        if product_id is None and not barcode:
+            raise ReceiptError(f'Item {number} sem produto ou código de barras')
+        parsed.append((number, product_id, barcode, quantity, expiration))
+    return parsed
+
+
+def receive_goods(lines):
+    """
+    Registra uma entrada de mercadoria (ex.: um caminhão de entrega) com
+    várias linhas {product_id ou barcode, quantity, expiration_date}.
+
+    Tudo em uma transação e com número fixo de consultas: até duas para
+    resolver os produtos, um bulk insert dos lotes, um do inventário, um
+    UPDATE do saldo materializado, somado uma vez por produto, e a saída
+    da lista de estoque baixo. Um item
+    inválido rejeita a entrada inteira. Devolve os lotes na ordem das linhas.
+    """
+    parsed = _receipt_lines(lines)
+
+    ids = {product_id for _, product_id, _, _, _ in parsed if product_id is not None}
+    barcodes = {barcode for _, product_id, barcode, _, _ in parsed if product_id is None}
+    by_id = Product.objects.in_bulk(ids) if ids else {}
+    by_barcode = Product.objects.in_bulk(barcodes, field_name='barcode') if barcodes else {}
+
+    products = []
+    for number, product_id, barcode, _, _ in parsed:
+        product = by_id.get(product_id) if product_id is not None else by_barcode.get(barcode)
+        if product is None:
+            raise ReceiptError(f'Produto não encontrado no item {number}')
+        products.append(product)
+
+    totals = defaultdict(int)
+    with transaction.atomic():
+        batches = Batch.objects.bulk_create([
+            Batch(product=product, quantity=quantity, expiration_date=expiration)
+            for product, (_, _, _, quantity, expiration) in zip(products, parsed)
+        ])
+        Inventory.objects.bulk_create([
+            Inventory(product=batch.product, batch=batch, quantity=batch.quantity, expiration_date=batch.expiration_date)
+            for batch in batches
+        ])
+        for batch in batches:
+            totals[batch.product_id] += batch.quantity
+        adjust_stock(totals)
+    return batches
@@ -1,3 +1,1116 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import warnings
+from decimal import Decimal
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    AuthToken, Batch, Category, DailyPaymentMethodSales, DailyProductSales, DailySales, IdempotencyKey, Inventory,
+    PaymentMethod, Product, Sale, SaleItem, User
+)
+from . import async_views, metrics, views
+from .exports import SALE_COLUMNS
+from .middleware import InstrumentationMiddleware, ProfilingMiddleware
+from .pagination import encode_cursor
+from .sales import SaleError, purge_idempotency_keys
+from .stock import adjust_stock, find_stock_drift, rebuild_stock, rebuild_watchlist
+from .tokens import hash_token, issue_token, purge_expired_tokens, token_cache
+from .writer import SaleWriter
+
+
+class PdvTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caixa', 'caixa@example.com', 'senha123', name='Caixa')
+        cls.category = Category.objects.create(name='Mercearia')
+        cls.payment_method = PaymentMethod.objects.create(name='Dinheiro')
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+
+    def create_product(self, name, price='10.00', barcode=None, stock=()):
+        product = Product.objects.create(
+            name=name,
+            category=self.category,
+            price=Decimal(price),
+            barcode=barcode
+        )
+        for quantity in stock:
+            self.add_stock(product, quantity)
+        return product
+
+    def add_stock(self, product, quantity, expiration_date=None):
+        batch = Batch.objects.create(product=product, quantity=quantity, expiration_date=expiration_date)
+        Inventory.objects.create(product=product, batch=batch, quantity=quantity, expiration_date=expiration_date)
+        adjust_stock({product.id: quantity})
+        return batch
+
+    def post_json(self, url, data, **extra):
+        return self.client.post(url, json.dumps(data), content_type='application/json', **extra)
+
+    def sale_payload(self, items, **extra):
+        payload = {
+            'username': self.user.username,
+            'payment_method_id': self.payment_method.id,
+            'items': items
+        }
+        payload.update(extra)
+        return payload
+
+
+class CreateSaleTests(PdvTestCase):
+    def test_creates_sale_items_and_total(self):
+        rice = self.create_product('Arroz', '20.00', stock=[10])
+        beans = self.create_product('Feijão', '8.50', stock=[10])
+
+        response = self.post_json('/api/sales/create/', self.sale_payload(
+            [{'product_id': rice.id, 'quantity': 2}, {'product_id': beans.id, 'quantity': 1}],
+            discount=1.5,
+            addition=1
+        ))
+
+        self.assertEqual(response.status_code, 200)
+        sale = Sale.objects.get(id=response.json()['sale_id'])
+        self.assertEqual(sale.total_amount, Decimal('48.00'))
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(SaleItem.objects.get(sale=sale, product=beans).total_price, Decimal('8.50'))
+
+    def test_consumes_batches_in_fifo_order(self):
+        product = self.create_product('Leite')
+        first = self.add_stock(product, 3)
+        second = self.add_stock(product, 5)
+
+        self.post_json('/api/sales/create/', self.sale_payload([
+            {'product_id': product.id, 'quantity': 2},
+            {'product_id': product.id, 'quantity': 2},
+        ]))
+
+        self.assertEqual(Inventory.objects.get(batch=first).quantity, 0)
+        self.assertEqual(Inventory.objects.get(batch=second).quantity, 4)
+
+    def test_rejects_overselling(self):
+        product = self.create_product('Óleo', stock=[2, 3])
+
+        response = self.post_json('/api/sales/create/', self.sale_payload([
+            {'product_id': product.id, 'quantity': 4},
+            {'product_id': product.id, 'quantity': 2},
+        ]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Estoque insuficiente para Óleo: disponível 1')
+        self.assertFalse(Sale.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
+        self.assertEqual(sum(Inventory.objects.filter(product=product).values_list('quantity', flat=True)), 5)
+
+    def test_unknown_product_rolls_back(self):
+        product = self.create_product('Café', stock=[5])
+
+        response = self.post_json('/api/sales/create/', self.sale_payload([
+            {'product_id': product.id, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(Inventory.objects.get(product=product).quantity, 5)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        products = [self.create_product(f'Produto {i}', stock=[2, 2, 50]) for i in range(40)]
+
+        def items(count):
+            return [{'product_id': p.id, 'quantity': 3} for p in products[:count]]
+
+        # usuário, forma de pagamento, savepoint, produtos, lotes, venda,
+        # itens, estoque, saldo dos produtos, lista de estoque baixo,
+        # 3 agregados, release savepoint
+        with self.assertNumQueries(14):
+            self.post_json('/api/sales/create/', self.sale_payload(items(1)))
+        with self.assertNumQueries(14):
+            self.post_json('/api/sales/create/', self.sale_payload(items(40)))
+
+
+class StockCounterTests(PdvTestCase):
+    def test_sale_and_batch_update_materialized_stock(self):
+        product = self.create_product('Açúcar', stock=[4])
+
+        self.post_json('/api/batches/add/', {'product_id': product.id, 'quantity': 6})
+        self.post_json('/api/sales/create/', self.sale_payload([{'product_id': product.id, 'quantity': 7}]))
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+        response = self.client.get('/api/inventory/')
+        self.assertEqual(response.json()['results'], [{'id': product.id, 'name': 'Açúcar', 'total_quantity': 3}])
+
+    def test_product_edit_does_not_overwrite_stock_sold_meanwhile(self):
+        self.create_product('Farinha', stock=[5])
+        product = Product.objects.get(name='Farinha')
+
+        self.post_json('/api/sales/create/', self.sale_payload([{'product_id': product.id, 'quantity': 2}]))
+        product.name = 'Farinha de trigo'
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.stock), ('Farinha de trigo', 3))
+        self.assertEqual(find_stock_drift(), [])
+
+    def test_rebuild_stock_reports_and_fixes_drift(self):
+        product = self.create_product('Sal', stock=[5])
+        Product.objects.filter(pk=product.pk).update(stock=42)
+
+        out = StringIO()
+        call_command('rebuild_stock', stdout=out)
+
+        self.assertIn(f'Produto {product.id}: saldo 42, inventário 5', out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
+
+    def test_rebuild_stock_rechecks_drift_with_products_locked(self):
+        product = self.create_product('Pimenta', stock=[5])
+        self.post_json('/api/sales/create/', self.sale_payload([{'product_id': product.id, 'quantity': 2}]))
+
+        # Inventário somado antes da venda e saldo lido depois dela
+        with mock.patch('pdv.stock.find_stock_drift', return_value=[(product.id, 3, 5)]):
+            self.assertEqual(rebuild_stock(), [])
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+        self.assertEqual(find_stock_drift(), [])
+
+
+class GoodsReceiptTests(PdvTestCase):
+    def test_receives_many_lines_in_fixed_queries(self):
+        rice = self.create_product('Arroz', barcode='7891000100103', stock=[5])
+        beans = self.create_product('Feijão')
+
+        # produtos por id, por código de barras, lotes, inventário, saldo,
+        # lista de estoque baixo e o savepoint
+        with self.assertNumQueries(8):
+            response = self.post_json('/api/receipts/', {'lines': [
+                {'product_id': beans.id, 'quantity': 10, 'expiration_date': '2030-01-31'},
+                {'barcode': '7891000100103', 'quantity': 4},
+                {'product_id': rice.id, 'quantity': 6},
+            ]})
+
+        data = response.json()
+        self.assertEqual((data['products'], data['units']), (2, 20))
+        self.assertEqual([line['product_id'] for line in data['batches']], [beans.id, rice.id, rice.id])
+        rice.refresh_from_db()
+        beans.refresh_from_db()
+        self.assertEqual((rice.stock, beans.stock), (15, 10))
+        batch = Batch.objects.get(id=data['batches'][0]['batch_id'])
+        self.assertEqual(str(batch.expiration_date), '2030-01-31')
+        self.assertEqual(Inventory.objects.get(batch=batch).quantity, 10)
+
+    def test_invalid_line_rejects_whole_receipt(self):
+        product = self.create_product('Café')
+
+        response = self.post_json('/api/receipts/', {'lines': [
+            {'product_id': product.id, 'quantity': 3},
+            {'barcode': 'inexistente', 'quantity': 1},
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Produto não encontrado no item 2')
+        self.assertFalse(Batch.objects.exists())
+
+    def test_add_batch_creates_inventory_for_new_batch(self):
+        product = self.create_product('Sal')
+
+        response = self.post_json('/api/batches/add/', {'product_id': product.id, 'quantity': 8})
+
+        batch = Batch.objects.get(id=response.json()['batch_id'])
+        self.assertEqual(Inventory.objects.get(batch=batch).quantity, 8)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 8)
+
+
+class InventoryWatchlistTests(PdvTestCase):
+    def report(self):
+        return self.client.get('/api/reports/inventory/').json()
+
+    def test_low_stock_follows_sales_receipts_and_reorder_level(self):
+        product = self.create_product('Arroz', stock=[12])
+        self.assertEqual(self.report()['low_stock'], [])
+
+        self.post_json('/api/sales/create/', self.sale_payload([{'product_id': product.id, 'quantity': 5}]))
+        self.assertEqual(self.report()['low_stock'], [{
+            'product_id': product.id, 'product__name': 'Arroz', 'product__reorder_level': 10, 'total': 7
+        }])
+
+        self.post_json('/api/receipts/', {'lines': [{'product_id': product.id, 'quantity': 3}]})
+        self.assertEqual(self.report()['low_stock'], [])
+
+        self.post_json(f'/api/products/manage/{product.id}/', {
+            'name': 'Arroz', 'price': '10.00', 'category_id': self.category.id, 'reorder_level': 20
+        })
+        self.assertEqual([row['total'] for row in self.report()['low_stock']], [10])
+
+    def test_report_reads_watchlist_instead_of_scanning_products(self):
+        self.create_product('Sem estoque')
+        self.create_product('Cheio', stock=[50])
+        # Divergência proposital: o relatório confia na lista, não no saldo
+        Product.objects.filter(name='Cheio').update(stock=1)
+
+        self.assertEqual([row['product__name'] for row in self.report()['low_stock']], ['Sem estoque'])
+
+        call_command('rebuild_stock', stdout=StringIO())
+        self.assertEqual([row['product__name'] for row in self.report()['low_stock']], ['Sem estoque'])
+        Product.objects.filter(name='Cheio').update(stock=1)
+        rebuild_watchlist()
+        self.assertEqual([row['product__name'] for row in self.report()['low_stock']], ['Sem estoque', 'Cheio'])
+
+    def test_expiring_soon_only_counts_batches_with_stock(self):
+        today = timezone.localdate()
+        milk = self.create_product('Leite', stock=[20])
+        self.post_json('/api/receipts/', {'lines': [
+            {'product_id': milk.id, 'quantity': 4, 'expiration_date': str(today + timedelta(days=3))},
+            {'product_id': milk.id, 'quantity': 6, 'expiration_date': str(today + timedelta(days=30))},
+        ]})
+        yogurt = self.create_product('Iogurte')
+        self.add_stock(yogurt, 2, expiration_date=today + timedelta(days=1))
+        Inventory.objects.filter(product=yogurt).update(quantity=0)
+
+        self.assertEqual(self.report()['expiring_soon'], [
+            {'product__name': 'Leite', 'expiration_date': str(today + timedelta(days=3)), 'quantity': 4}
+        ])
+
+    def test_editing_batch_expiration_updates_expiring_soon(self):
+        today = timezone.localdate()
+        milk = self.create_product('Leite')
+        batch = self.add_stock(milk, 5, expiration_date=today + timedelta(days=60))
+        self.assertEqual(self.report()['expiring_soon'], [])
+
+        # Ex.: correção da validade pelo admin
+        batch.expiration_date = today + timedelta(days=2)
+        batch.save()
+
+        self.assertEqual(self.report()['expiring_soon'], [
+            {'product__name': 'Leite', 'expiration_date': str(today + timedelta(days=2)), 'quantity': 5}
+        ])
+
+
+class SyncSalesTests(PdvTestCase):
+    def test_bad_sale_does_not_abort_batch(self):
+        product = self.create_product('Biscoito', '3.00', stock=[10])
+        sales = [
+            self.sale_payload([{'product_id': product.id, 'quantity': 2}]),
+            self.sale_payload([{'product_id': 999999, 'quantity': 1}]),
+            self.sale_payload([{'product_id': product.id, 'quantity': 3}], payment_method_id=999999),
+            self.sale_payload([{'product_id': product.id, 'quantity': 1}]),
+        ]
+
+        with self.settings(PDV_SALE_SYNC_CHUNK_SIZE=3):
+            response = self.post_json('/api/sales/sync/', {'sales': sales})
+
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((body['created'], body['failed']), (2, 2))
+        self.assertEqual([r['status'] for r in body['results']], ['success', 'error', 'error', 'success'])
+        self.assertEqual(Sale.objects.count(), 2)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 7)
+
+    def test_unhashable_fields_only_reject_their_sale(self):
+        product = self.create_product('Bolacha', '2.00', stock=[10])
+        items = [{'product_id': product.id, 'quantity': 1}]
+        sales = [
+            self.sale_payload(items, username=['caixa']),
+            self.sale_payload(items, idempotency_key=['offline-1']),
+            self.sale_payload(items, payment_method_id={'id': self.payment_method.id}),
+            self.sale_payload(items, idempotency_key='offline-2'),
+        ]
+
+        response = self.post_json('/api/sales/sync/', {'sales': sales})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(r['status'], r.get('message')) for r in response.json()['results']], [
+            ('error', 'Usuário inválido'),
+            ('error', 'Chave de idempotência inválida'),
+            ('error', 'Método de pagamento não encontrado'),
+            ('success', None),
+        ])
+        self.assertEqual(Sale.objects.count(), 1)
+
+
+class IdempotencyTests(PdvTestCase):
+    def test_retry_replays_original_response(self):
+        product = self.create_product('Pão', '1.50', stock=[10])
+        payload = self.sale_payload([{'product_id': product.id, 'quantity': 2}])
+
+        first = self.post_json('/api/sales/create/', payload, HTTP_IDEMPOTENCY_KEY='terminal-1-0001')
+        with self.assertNumQueries(1):
+            retry = self.post_json('/api/sales/create/', payload, HTTP_IDEMPOTENCY_KEY='terminal-1-0001')
+
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Sale.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 8)
+
+    def test_sync_replays_known_and_repeated_keys(self):
+        product = self.create_product('Manteiga', stock=[10])
+        sale = self.sale_payload([{'product_id': product.id, 'quantity': 1}], idempotency_key='offline-7')
+        self.post_json('/api/sales/create/', sale)
+
+        retried = dict(sale, idempotency_key='offline-8')
+        response = self.post_json('/api/sales/sync/', {'sales': [sale, retried, retried]})
+
+        results = response.json()['results']
+        self.assertTrue(results[0]['replayed'])
+        self.assertNotIn('replayed', results[1])
+        self.assertEqual(results[2]['sale_id'], results[1]['sale_id'])
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_purge_removes_only_expired_keys(self):
+        product = self.create_product('Ovos', stock=[10])
+        for key in ('antiga', 'recente'):
+            payload = self.sale_payload([{'product_id': product.id, 'quantity': 1}], idempotency_key=key)
+            self.post_json('/api/sales/create/', payload)
+        IdempotencyKey.objects.filter(key='antiga').update(created_at=timezone.now() - timedelta(hours=49))
+
+        with self.settings(PDV_IDEMPOTENCY_KEY_TTL_HOURS=48):
+            self.assertEqual(purge_idempotency_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['recente'])
+
+
+class ProductSearchTests(PdvTestCase):
+    def search(self, term, **params):
+        return self.client.get('/api/products/', dict(params, search=term)).json()['results']
+
+    def test_matches_name_prefix_barcode_and_category_ranked(self):
+        rice = self.create_product('Arroz Tio João', barcode='7891000100103')
+        self.create_product('Farinha de arroz', barcode='7891000200200')
+        self.create_product('Feijão', barcode='7896000000001')
+
+        self.assertEqual([p['name'] for p in self.search('arroz')], ['Arroz Tio João', 'Farinha de arroz'])
+        self.assertEqual([p['id'] for p in self.search('arr ti')], [rice.id])
+        self.assertEqual([p['name'] for p in self.search('feijao')], ['Feijão'])
+        self.assertEqual([p['id'] for p in self.search('78910001001')], [rice.id])
+        self.assertEqual(len(self.search('mercearia')), 3)
+        self.assertEqual(len(self.search('mercearia', limit=2)), 2)
+        self.assertEqual(self.search('arroz')[0]['category__name'], 'Mercearia')
+
+    def test_exact_barcode_ranks_first(self):
+        # Casam pelo nome, sem código de barras (NULL no PostgreSQL)
+        self.create_product('Leite 7891 integral')
+        self.create_product('Leite 7891 desnatado')
+        cheese = self.create_product('Queijo', barcode='7891')
+
+        self.assertEqual(self.search('7891')[0]['id'], cheese.id)
+
+    def test_index_follows_product_and_category_changes(self):
+        product = self.create_product('Detergente')
+        product.name = 'Sabão em pó'
+        product.save()
+        self.category.name = 'Limpeza'
+        self.category.save()
+
+        self.assertEqual(self.search('detergente'), [])
+        self.assertEqual([p['id'] for p in self.search('sabao limpeza')], [product.id])
+
+        product.delete()
+        self.assertEqual(self.search('sabao'), [])
+
+
+class BarcodeCacheTests(PdvTestCase):
+    def test_second_lookup_is_served_from_cache(self):
+        product = self.create_product('Refrigerante', '7.99', barcode='7894900011517')
+
+        first = self.client.get('/api/products/barcode/7894900011517/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products/barcode/7894900011517/')
+
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.json()['category_name'], 'Mercearia')
+        self.assertEqual(second.json()['id'], product.id)
+        stats = self.client.get('/api/cache/stats/').json()['barcode']
+        self.assertGreaterEqual(stats['hits'], 1)
+
+    def test_writes_invalidate_cached_entries(self):
+        product = self.create_product('Suco', '5.00', barcode='111')
+        self.client.get('/api/products/barcode/111/')
+
+        self.client.put('/api/products/barcode/111/', json.dumps({'price': '6.00'}), content_type='application/json')
+        self.assertEqual(self.client.get('/api/products/barcode/111/').json()['price'], '6.00')
+
+        self.client.put(f'/api/categories/manage/{self.category.id}/', json.dumps({'name': 'Bebidas'}),
+                        content_type='application/json')
+        self.assertEqual(self.client.get('/api/products/barcode/111/').json()['category_name'], 'Bebidas')
+
+        self.post_json(f'/api/products/manage/{product.id}/', {
+            'name': 'Suco', 'price': '6.00', 'barcode': '222', 'category_id': self.category.id
+        })
+        self.assertEqual(self.client.get('/api/products/barcode/111/').status_code, 404)
+        self.assertEqual(self.client.get('/api/products/barcode/222/').json()['id'], product.id)
+
+
+class ConditionalGetTests(PdvTestCase):
+    def test_matching_etag_returns_304_without_reading_the_catalog(self):
+        self.create_product('Suco', '5.00', barcode='111')
+        first = self.client.get('/api/products/')
+        etag = first['ETag']
+
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], etag)
+        self.assertEqual(second.content, b'')
+
+    def test_catalog_writes_change_the_etag(self):
+        product = self.create_product('Suco', '5.00', barcode='111')
+        products = self.client.get('/api/products/')['ETag']
+        categories = self.client.get('/api/categories/')['ETag']
+        methods = self.client.get('/api/payment-methods/')['ETag']
+
+        self.client.put(f'/api/categories/manage/{self.category.id}/', json.dumps({'name': 'Bebidas'}),
+                        content_type='application/json')
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=products)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['category__name'], 'Bebidas')
+        self.assertNotEqual(self.client.get('/api/categories/')['ETag'], categories)
+        self.assertEqual(self.client.get('/api/payment-methods/')['ETag'], methods)
+
+        products = response['ETag']
+        product.price = Decimal('6.00')
+        product.save()
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=products).status_code, 200)
+
+        self.client.post('/api/products/import/', b'name,price,barcode,category\nLeite,4.00,222,Frios\n',
+                         content_type='text/csv')
+        self.assertNotEqual(self.client.get('/api/categories/')['ETag'], categories)
+        self.assertEqual(self.client.get('/api/products/?search=leite', HTTP_IF_NONE_MATCH=products).status_code, 200)
+
+    def test_sales_do_not_change_the_catalog_etag(self):
+        product = self.create_product('Suco', '5.00', barcode='111', stock=[5])
+        etag = self.client.get('/api/products/')['ETag']
+
+        response = self.post_json('/api/sales/create/', self.sale_payload([{'product_id': product.id, 'quantity': 1}]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    async def test_async_views_share_the_etag(self):
+        await sync_to_async(self.create_product)('Suco', '5.00', barcode='111')
+        etag = (await sync_to_async(views.list_categories)(RequestFactory().get('/api/categories/')))['ETag']
+
+        response = await async_views.list_categories(
+            AsyncRequestFactory().get('/api/categories/', headers={'If-None-Match': etag})
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogChangesTests(PdvTestCase):
+    def changes(self, since, **params):
+        return self.client.get('/api/catalog/changes/', {'since': since, **params}).json()
+
+    def test_full_load_then_only_changed_rows_and_tombstones(self):
+        suco = self.create_product('Suco', '5.00', barcode='111')
+        leite = self.create_product('Leite', '4.00', barcode='222')
+        full = self.changes(0)
+
+        self.assertFalse(full['has_more'])
+        self.assertEqual([row['name'] for row in full['changes']['products']], ['Suco', 'Leite'])
+        self.assertEqual(full['changes']['categories'], [{'id': self.category.id, 'name': 'Mercearia'}])
+        self.assertEqual(full['changes']['payment_methods'][0]['name'], 'Dinheiro')
+
+        suco.price = Decimal('6.00')
+        suco.save()
+        self.client.delete(f'/api/products/manage/{leite.id}/')
+        with self.assertNumQueries(2):
+            delta = self.changes(full['next_since'])
+
+        self.assertEqual(delta['changes']['products'], [{
+            'id': suco.id, 'name': 'Suco', 'price': '6.00', 'barcode': '111', 'category_id': self.category.id
+        }])
+        self.assertEqual(delta['deleted']['products'], [leite.id])
+        self.assertEqual(delta['changes']['categories'], [])
+        self.assertEqual(self.changes(delta['next_since'])['changes']['products'], [])
+
+    def test_pages_cover_every_row_once(self):
+        for i in range(5):
+            self.create_product(f'Produto {i}', barcode=str(i))
+        self.client.post('/api/products/import/', b'name,price,barcode,category\nNovo,1.00,9,Frios\n0,2.00,0,Frios\n',
+                         content_type='text/csv')
+
+        since, seen = 0, []
+        page = self.changes(since, limit=3)
+        while True:
+            seen += [('products', row['id']) for row in page['changes']['products']]
+            seen += [('categories', row['id']) for row in page['changes']['categories']]
+            since = page['next_since']
+            if not page['has_more']:
+                break
+            page = self.changes(since, limit=3)
+
+        products = Product.objects.values_list('id', flat=True)
+        self.assertCountEqual(seen, [('products', pk) for pk in products] + [
+            ('categories', pk) for pk in Category.objects.values_list('id', flat=True)
+        ])
+        self.assertEqual(Product.objects.get(barcode='0').name, '0')
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get('/api/catalog/changes/?since=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/catalog/changes/?since=-1').status_code, 400)
+
+
+class CatalogImportTests(PdvTestCase):
+    def import_file(self, content, content_type):
+        return self.client.post('/api/products/import/', content.encode(), content_type=content_type).json()
+
+    def test_csv_upserts_by_barcode_and_creates_categories(self):
+        product = self.create_product('Suco', '5.00', barcode='111')
+        self.client.get('/api/products/barcode/111/')
+
+        summary = self.import_file(
+            'name,price,barcode,category\n'
+            'Suco de Uva,"6,50",111,Bebidas\n'
+            'Arroz,22.90,222,Mercearia\n'
+            'Sem preço,,333,Mercearia\n'
+            'Feijão,8.00,444,Grãos\n'
+            'Feijão Carioca,8.50,444,Grãos\n',
+            'text/csv'
+        )
+
+        self.assertEqual((summary['inserted'], summary['updated'], summary['rejected']), (2, 1, 2))
+        self.assertEqual([error['row'] for error in summary['errors']], [4, 5])
+        self.assertEqual(Category.objects.filter(name='Bebidas').count(), 1)
+        self.assertEqual(Category.objects.filter(name='Mercearia').count(), 1)
+        self.assertEqual(Product.objects.get(barcode='444').name, 'Feijão Carioca')
+        # Cache e índice de busca acompanham os produtos atualizados
+        cached = self.client.get('/api/products/barcode/111/').json()
+        self.assertEqual((cached['id'], cached['price'], cached['category_name']), (product.id, '6.50', 'Bebidas'))
+        results = self.client.get('/api/products/', {'search': 'uva'}).json()['results']
+        self.assertEqual([p['id'] for p in results], [product.id])
+
+    def test_cache_is_invalidated_again_after_commit(self):
+        self.create_product('Suco', '5.00', barcode='111')
+        stale = self.client.get('/api/products/barcode/111/').json()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.import_file('name,price,barcode,category\nSuco,6.00,111,Mercearia\n', 'text/csv')
+            # Terminal que leu a linha antiga antes do commit e a recoloca no cache
+            with mock.patch('pdv.catalog_cache.product_payload', return_value=stale):
+                self.client.get('/api/products/barcode/111/')
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(self.client.get('/api/products/barcode/111/').json()['price'], '6.00')
+
+    @mock.patch('pdv.catalog_import.READ_SIZE', 7)
+    def test_json_array_is_read_in_pieces(self):
+        rows = [{'name': f'Produto {i}', 'price': 1 + i, 'barcode': f'b{i}', 'category': 'Mercearia'} for i in range(5)]
+
+        summary = self.import_file(json.dumps(rows), 'application/json')
+
+        self.assertEqual(summary['inserted'], 5)
+        self.assertEqual(Product.objects.get(barcode='b4').price, Decimal('5.00'))
+
+    def test_malformed_input_is_rejected(self):
+        response = self.client.post('/api/products/import/', b'[{"name": "x"', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/products/import/', b'x', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unreadable_rows_are_reported_with_line_number(self):
+        header = b'name,price,barcode,category\nSuco,5.00,111,Bebidas\n'
+        for content, content_type, message in [
+            (header + b'Leite,4.00,222,"' + b'x' * 200000 + b'"\n', 'text/csv', 'CSV inválido na linha 3'),
+            (header + b'Caf\xe9,4.00,222,Bebidas\n', 'text/csv', 'linha 3'),
+            (b'{"name": "Suco"}\n{"name": "Caf\xe9"}\n', 'application/x-ndjson', 'linha 2'),
+            (b'[{"name": "Suco"}, {"name": "Caf\xe9"}]', 'application/json', 'após o item 0'),
+        ]:
+            with self.subTest(content_type=content_type, message=message):
+                response = self.client.post('/api/products/import/', content, content_type=content_type)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()['message'])
+
+    def test_command_imports_ndjson_in_chunks(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            for i in range(5):
+                f.write(json.dumps({'name': f'Produto {i}', 'price': '2.00', 'barcode': f'n{i}', 'category': 'Limpeza'}) + '\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out = StringIO()
+        call_command('import_catalog', f.name, chunk_size=2, stdout=out)
+
+        self.assertIn('5 inserido(s), 0 atualizado(s), 0 rejeitado(s)', out.getvalue())
+        self.assertEqual(Product.objects.filter(category__name='Limpeza').count(), 5)
+
+
+class TokenAuthTests(PdvTestCase):
+    def login(self):
+        response = self.post_json('/api/login/', {'username': 'caixa', 'password': 'senha123'})
+        return {'HTTP_AUTHORIZATION': f"Bearer {response.json()['token']}"}
+
+    def test_token_is_resolved_from_cache(self):
+        auth = self.login()
+
+        first = self.client.get('/api/token/check/', **auth)
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/token/check/', **auth)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()['user']['username'], 'caixa')
+
+    def test_terminals_keep_independent_sessions(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.login()
+        second = self.login()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "pdv_user"')])
+
+        self.client.get('/api/token/check/', **first)
+        self.client.post('/api/logout/', **first)
+
+        self.assertEqual(self.client.get('/api/token/check/', **first).status_code, 401)
+        self.assertEqual(self.client.get('/api/token/check/', **second).status_code, 200)
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 1)
+
+    def test_expired_token_is_rejected_and_purged(self):
+        AuthToken.objects.create(
+            user=self.user,
+            token_hash=hash_token('expirado'),
+            expires=timezone.now() - timedelta(minutes=1)
+        )
+
+        response = self.client.get('/api/token/check/', HTTP_AUTHORIZATION='Bearer expirado')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], 'Token expirado')
+        self.login()
+        self.assertEqual(purge_expired_tokens(), 1)
+        self.assertEqual(AuthToken.objects.count(), 1)
+
+
+class SalesRollupTests(PdvTestCase):
+    def sell(self, *items, **extra):
+        payload = self.sale_payload([{'product_id': p.id, 'quantity': q} for p, q in items], **extra)
+        return self.post_json('/api/sales/create/', payload).json()['sale_id']
+
+    def test_sales_update_daily_rollups(self):
+        coffee = self.create_product('Café', '12.00', stock=[50])
+        milk = self.create_product('Leite', '5.00', stock=[50])
+        self.sell((coffee, 2), (milk, 1))
+        self.sell((coffee, 1), (coffee, 1))
+
+        today = DailySales.objects.get(date=timezone.localdate())
+        self.assertEqual((today.count, today.total), (2, Decimal('53.00')))
+        self.assertEqual(DailyProductSales.objects.get(product=coffee).units, 4)
+
+    def test_report_combines_closed_days_and_current_day(self):
+        coffee = self.create_product('Café', '12.00', stock=[50])
+        milk = self.create_product('Leite', '5.00', stock=[50])
+        card = PaymentMethod.objects.create(name='Cartão')
+        old = [self.sell((milk, 4)), self.sell((coffee, 1), payment_method_id=card.id)]
+        yesterday = timezone.now() - timedelta(days=1)
+        Sale.objects.filter(id__in=old).update(sale_datetime=yesterday)
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.sell((coffee, 2), payment_method_id=card.id)
+
+        report = self.client.get('/api/reports/sales/').json()
+
+        self.assertEqual(
+            [(row['count'], row['total']) for row in report['sales_by_date']],
+            [(2, '32.00'), (1, '24.00')]
+        )
+        payments = {row['payment_method__name']: (row['count'], row['total']) for row in report['payment_methods']}
+        self.assertEqual(payments, {'Dinheiro': (1, '20.00'), 'Cartão': (2, '36.00')})
+        self.assertEqual(
+            [(row['product__name'], row['total_units'], row['total_value']) for row in report['top_products']],
+            [('Café', 3, '36.00'), ('Leite', 4, '20.00')]
+        )
+        closed = self.client.get('/api/reports/sales/', {'to': yesterday.date().isoformat()}).json()
+        self.assertEqual([row['product__name'] for row in closed['top_products']], ['Leite', 'Café'])
+
+
+class ExportTests(PdvTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.create_product('Chá', '4.00', barcode='123', stock=[20])
+        for quantity in (1, 2):
+            payload = self.sale_payload([{'product_id': self.product.id, 'quantity': quantity}])
+            self.post_json('/api/sales/create/', payload)
+
+    def test_streams_sales_as_csv(self):
+        response = self.client.get('/api/exports/sales/')
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), SALE_COLUMNS)
+        self.assertEqual([line.split(',')[-1] for line in lines[1:]], ['4.00', '8.00'])
+
+    def test_streams_gzipped_ndjson_sale_items(self):
+        response = self.client.get('/api/exports/sale-items/', {'format': 'ndjson', 'gzip': '1'})
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([(row['product_name'], row['units'], row['username']) for row in rows],
+                         [('Chá', 1, 'caixa'), ('Chá', 2, 'caixa')])
+
+    async def test_streams_asynchronously_under_asgi(self):
+        with warnings.catch_warnings():
+            # O Django avisa ao consumir um iterador síncrono por inteiro
+            warnings.simplefilter('error')
+            response = await self.async_client.get('/api/exports/sales/', {'format': 'ndjson'})
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual([json.loads(line)['total_amount'] for line in body.splitlines()], ['4.00', '8.00'])
+
+
+class PaginationTests(PdvTestCase):
+    def fetch_all(self, url, **params):
+        pages, cursor = [], None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            body = self.client.get(url, query).json()
+            pages.append(body['results'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_walks_every_list_endpoint_with_cursors(self):
+        products = [self.create_product(f'Produto {i}', stock=[1]) for i in range(5)]
+        for i in range(4):
+            Category.objects.create(name=f'Categoria {i}')
+            PaymentMethod.objects.create(name=f'Método {i}')
+
+        pages = self.fetch_all('/api/products/', limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([row['id'] for page in pages for row in page], [p.id for p in products])
+        self.assertEqual(len(self.fetch_all('/api/inventory/', limit=2)), 3)
+        self.assertEqual([len(page) for page in self.fetch_all('/api/categories/', limit=3)], [3, 2])
+        self.assertEqual([len(page) for page in self.fetch_all('/api/payment-methods/', limit=5)], [5])
+
+    def test_deep_pages_seek_by_key(self):
+        self.create_product('Único')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products/', {'cursor': encode_cursor(10 ** 6)})
+        self.assertIn('"pdv_product"."id" > 1000000', queries[-1]['sql'])
+        self.assertNotIn('OFFSET', queries[-1]['sql'])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/categories/', {'cursor': '%%%'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/categories/', {'cursor': encode_cursor('x')}).status_code, 400)
+
+
+class AsyncViewTests(PdvTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        self.product = self.create_product('Água', '2.50', barcode='789', stock=[3])
+
+    async def test_read_endpoints_match_sync_views(self):
+        for async_view, sync_view, path in [
+            (async_views.get_products, views.get_products, '/api/products/'),
+            (async_views.get_inventory, views.get_inventory, '/api/inventory/'),
+            (async_views.inventory_report, views.inventory_report, '/api/reports/inventory/'),
+            (async_views.sales_report, views.sales_report, '/api/reports/sales/'),
+            (async_views.list_categories, views.list_categories, '/api/categories/'),
+            (async_views.list_payment_methods, views.list_payment_methods, '/api/payment-methods/'),
+            (async_views.catalog_changes, views.catalog_changes, '/api/catalog/changes/'),
+        ]:
+            with self.subTest(path=path):
+                expected = await sync_to_async(sync_view)(RequestFactory().get(path))
+                response = await async_view(self.factory.get(path))
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    async def test_barcode_lookup(self):
+        found = await async_views.product_by_barcode(self.factory.get('/'), '789')
+        missing = await async_views.product_by_barcode(self.factory.get('/'), '000')
+
+        self.assertEqual(json.loads(found.content)['name'], 'Água')
+        self.assertEqual(missing.status_code, 404)
+
+
+class InstrumentationTests(PdvTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        self.create_product('Água', '2.50', barcode='789')
+
+        response = self.client.get('/api/products/barcode/789/')
+
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn(f'size;desc="{len(response.content)} bytes"', timing)
+
+    def test_metrics_endpoint_exposes_histograms_per_url_name(self):
+        self.create_product('Água', '2.50', barcode='789')
+        self.client.get('/api/products/barcode/789/')
+        self.client.get('/api/products/barcode/789/')
+
+        body = self.client.get('/api/metrics/').content.decode()
+
+        labels = 'view="product_by_barcode",method="GET"'
+        self.assertIn('# TYPE pdv_request_duration_seconds histogram', body)
+        self.assertIn(f'pdv_request_duration_seconds_count{{{labels}}} 2', body)
+        # Segunda leitura vem do cache, sem consulta
+        self.assertIn(f'pdv_db_queries_bucket{{{labels},le="0"}} 1', body)
+        self.assertIn(f'pdv_db_queries_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn(f'pdv_responses_total{{{labels},status="200"}} 2', body)
+
+    def test_unknown_methods_and_label_values_are_safe(self):
+        self.client.generic('BREW', '/api/products/')
+        self.client.generic('XYZZY', '/api/products/')
+        metrics.observe('pdv_db_queries', (('view', 'a"b\\c\nd'), ('method', 'GET')), 1)
+
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('pdv_request_duration_seconds_count{view="products",method="other"} 2', body)
+        self.assertNotIn('BREW', body)
+        self.assertIn('pdv_db_queries_count{view="a\\"b\\\\c\\nd",method="GET"} 1', body)
+
+    def test_streamed_response_size_is_recorded_after_streaming(self):
+        response = self.client.get('/api/exports/sales/?from=2000-01-01')
+        size = len(b''.join(response.streaming_content))
+
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn(f'pdv_response_size_bytes_sum{{view="export_sales",method="GET"}} {size}', body)
+
+    @override_settings(PDV_N_PLUS_ONE_THRESHOLD=2)
+    def test_warns_about_repeated_queries(self):
+        products = [self.create_product(f'Produto {i}') for i in range(3)]
+
+        def view(request):
+            # Uma consulta por produto
+            for product in products:
+                Product.objects.get(pk=product.pk)
+            return JsonResponse({})
+
+        with self.assertLogs('pdv.metrics', 'WARNING') as logs:
+            InstrumentationMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertIn('consulta repetida 3 vezes', logs.output[0])
+
+
+class ProfilingTests(PdvTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = override_settings(PDV_PROFILING=True, PDV_PROFILE_DIR=directory.name, PDV_PROFILE_KEEP=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.admin = User.objects.create_user('gerente', 'gerente@example.com', 'senha123', name='Gerente', is_admin=True)
+        token, _ = issue_token(self.admin)
+        # Novo cliente: os middlewares são carregados com PDV_PROFILING ligado
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_admin_request_is_profiled_and_listed(self):
+        response = self.client.get('/api/reports/sales/', HTTP_X_PDV_PROFILE='1')
+        profile_id = response['X-PDV-Profile-Id']
+
+        profiles = self.client.get('/api/profiles/').json()['results']
+        self.assertEqual([p['id'] for p in profiles], [profile_id])
+        self.assertEqual(profiles[0]['view'], 'sales_report')
+        self.assertEqual(profiles[0]['status'], 200)
+
+        summary = self.client.get(f'/api/profiles/{profile_id}/')
+        self.assertIn('function calls', summary.content.decode())
+        binary = self.client.get(f'/api/profiles/{profile_id}/?format=pstats')
+        self.assertEqual(binary['Content-Disposition'], f'attachment; filename="{profile_id}.prof"')
+
+    def test_keeps_only_most_recent_profiles(self):
+        ids = [self.client.get('/api/categories/', HTTP_X_PDV_PROFILE='1')['X-PDV-Profile-Id'] for _ in range(3)]
+
+        profiles = self.client.get('/api/profiles/').json()['results']
+        self.assertEqual([p['id'] for p in profiles], ids[:0:-1])
+        self.assertEqual(self.client.get(f'/api/profiles/{ids[0]}/').status_code, 404)
+
+    def test_non_admin_cannot_profile_or_list(self):
+        token, _ = issue_token(self.user)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        response = client.get('/api/categories/', HTTP_X_PDV_PROFILE='1')
+
+        self.assertFalse(response.has_header('X-PDV-Profile-Id'))
+        self.assertEqual(client.get('/api/profiles/').status_code, 403)
+
+    def test_middleware_is_dropped_when_disabled(self):
+        with override_settings(PDV_PROFILING=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+
+
+class GenerateDatasetTests(PdvTestCase):
+    def test_generates_consistent_dataset(self):
+        call_command(
+            'generate_dataset', categories=3, products=20, batches=2, sales=30, days=5, users=2,
+            chunk_size=7, stdout=StringIO()
+        )
+
+        self.assertEqual(Product.objects.filter(barcode__startswith='789').count(), 20)
+        self.assertEqual(Batch.objects.count(), 40)
+        self.assertEqual(Sale.objects.count(), 30)
+        self.assertEqual(find_stock_drift(), [])
+        self.assertEqual(
+            DailySales.objects.aggregate(total=Sum('count'))['total'],
+            Sale.objects.count()
+        )
+        self.assertEqual(
+            DailyProductSales.objects.aggregate(total=Sum('units'))['total'],
+            SaleItem.objects.aggregate(total=Sum('units'))['total']
+        )
+
+    def test_refuses_to_run_twice(self):
+        call_command('generate_dataset', categories=1, products=2, batches=1, sales=1, users=1, stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', categories=1, products=2, batches=1, sales=1, users=1, stdout=StringIO())
+
+
+class RollupMigrationTests(TransactionTestCase):
+    """0009 sobre um banco que já tem vendas: os agregados saem do histórico."""
+
+    def setUp(self):
+        call_command('migrate', 'pdv', '0008_authtoken', verbosity=0)
+        self.addCleanup(call_command, 'migrate', verbosity=0)
+
+    def test_backfills_daily_rollups_from_existing_sales(self):
+        apps = MigrationExecutor(connection).loader.project_state(('pdv', '0008_authtoken')).apps
+        User = apps.get_model('pdv', 'User')
+        Category = apps.get_model('pdv', 'Category')
+        Product = apps.get_model('pdv', 'Product')
+        PaymentMethod = apps.get_model('pdv', 'PaymentMethod')
+        OldSale = apps.get_model('pdv', 'Sale')
+        OldSaleItem = apps.get_model('pdv', 'SaleItem')
+
+        user = User.objects.create(username='caixa', name='Caixa')
+        method = PaymentMethod.objects.create(name='Dinheiro')
+        product = Product.objects.create(name='Suco', price=Decimal('5.00'), category=Category.objects.create(name='Bebidas'))
+        for units in (1, 2):
+            sale = OldSale.objects.create(user=user, payment_method=method, total_amount=Decimal('5.00') * units)
+            OldSaleItem.objects.create(sale=sale, product=product, units=units, unit_price=Decimal('5.00'),
+                                       total_price=Decimal('5.00') * units)
+
+        call_command('migrate', 'pdv', '0009_daily_sales_rollups', verbosity=0)
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.count, day.total), (2, Decimal('15.00')))
+        self.assertEqual(DailyPaymentMethodSales.objects.get().count, 2)
+        self.assertEqual(DailyProductSales.objects.get().units, 3)
+
+
+class ConcurrentTerminalTests(TransactionTestCase):
+    """
+    Vários terminais vendendo ao mesmo tempo, cada um com sua conexão.
+    Roda contra o banco configurado (PDV_DB_ENGINE=postgresql para o PostgreSQL).
+    """
+    terminals = 8
+    sales_per_terminal = 5
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user('caixa', 'caixa@example.com', 'senha123', name='Caixa')
+        self.payment_method = PaymentMethod.objects.create(name='Dinheiro')
+        category = Category.objects.create(name='Mercearia')
+        self.product = Product.objects.create(name='Arroz', category=category, price=Decimal('10.00'))
+        self.stock_product(100, 100)
+
+    def stock_product(self, *quantities):
+        for quantity in quantities:
+            batch = Batch.objects.create(product=self.product, quantity=quantity)
+            Inventory.objects.create(product=self.product, batch=batch, quantity=quantity)
+        adjust_stock({self.product.id: sum(quantities)})
+
+    def terminal(self, statuses):
+        client = Client()
+        payload = json.dumps({
+            'username': self.user.username,
+            'payment_method_id': self.payment_method.id,
+            'items': [{'product_id': self.product.id, 'quantity': 1}]
+        })
+        try:
+            for _ in range(self.sales_per_terminal):
+                response = client.post('/api/sales/create/', payload, content_type='application/json')
+                statuses.append(response.status_code)
+        finally:
+            connections.close_all()
+
+    def run_terminals(self):
+        statuses = []
+        threads = [threading.Thread(target=self.terminal, args=(statuses,)) for _ in range(self.terminals)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def assertStock(self, expected, sold):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, expected)
+        self.assertEqual(Inventory.objects.aggregate(total=Sum('quantity'))['total'], expected)
+        self.assertEqual(SaleItem.objects.aggregate(total=Sum('units'))['total'], sold)
+
+    def test_concurrent_sales_do_not_lose_updates(self):
+        total = self.terminals * self.sales_per_terminal
+
+        self.assertEqual(self.run_terminals(), [200] * total)
+        self.assertEqual(Sale.objects.count(), total)
+        self.assertStock(200 - total, total)
+
+    def test_hot_sku_is_never_oversold(self):
+        # Só 30 unidades para 40 vendas concorrentes
+        Inventory.objects.update(quantity=0)
+        Product.objects.update(stock=0)
+        self.stock_product(20, 10)
+
+        statuses = self.run_terminals()
+
+        self.assertEqual(statuses.count(200), 30)
+        self.assertEqual(statuses.count(400), 10)
+        self.assertStock(0, 30)
+
+    @override_settings(PDV_SALE_WRITER=True)
+    def test_sale_writer_groups_concurrent_sales(self):
+        writer = SaleWriter(max_batch=100, max_wait_ms=200)
+        self.addCleanup(writer.shutdown)
+        total = self.terminals * self.sales_per_terminal
+
+        with mock.patch('pdv.writer._writer', writer):
+            self.assertEqual(self.run_terminals(), [200] * total)
+
+        self.assertStock(200 - total, total)
+        self.assertEqual(writer.stats()['sales'], total)
+        self.assertLess(writer.stats()['batches'], total)
+
+    def test_rejected_sale_does_not_undo_batch(self):
+        writer = SaleWriter(max_batch=10, max_wait_ms=200)
+        self.addCleanup(writer.shutdown)
+
+        futures = [
+            writer.submit(self.user, self.payment_method, [{'product_id': product_id, 'quantity': 1}])
+            for product_id in (self.product.id, 999999, self.product.id)
+        ]
+
+        self.assertIsInstance(futures[0].result(), Sale)
+        with self.assertRaises(SaleError):
+            futures[1].result()
+        self.assertIsInstance(futures[2].result(), Sale)
+        self.assertEqual(writer.stats(), {'batches': 1, 'sales': 2})
+        self.assertEqual(Sale.objects.count(), 2)
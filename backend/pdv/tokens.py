@@ -0,0 +1,147 @@
+import copy
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import AuthToken
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    Cache LRU limitado, com validade, de hash do token -> (usuário, expiração).
+    Cada entrada vale no máximo `ttl` segundos, e nunca além da expiração do
+    próprio token.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash):
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            user, expires, valid_until = entry
+            if time.monotonic() >= valid_until:
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+        # Cópia: cada requisição pode alterar o próprio request.user
+        return copy.copy(user), expires
+
+    def set(self, token_hash, user, expires):
+        ttl = min(self.ttl, (expires - timezone.now()).total_seconds())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token_hash] = (copy.copy(user), expires, time.monotonic() + ttl)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, token_hash):
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            stale = [key for key, (user, _, _) in self._entries.items() if user.pk == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.PDV_TOKEN_CACHE_SIZE, settings.PDV_TOKEN_CACHE_TTL)
+
+
+def hash_token(token):
+    # Só o hash fica no banco: um dump da tabela não expõe sessões válidas
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_token(user):
+    """Cria uma nova sessão para `user` e devolve (token, expiração)."""
+    token = secrets.token_hex(20)
+    expires = timezone.now() + timedelta(hours=settings.PDV_TOKEN_LIFETIME_HOURS)
+    AuthToken.objects.create(user=user, token_hash=hash_token(token), expires=expires)
+    schedule_token_purge()
+    return token, expires
+
+
+def resolve_token(token):
+    """
+    Devolve (usuário, expiração) do token, do cache ou do índice de
+    token_hash, ou None se o token não existir.
+    """
+    token_hash = hash_token(token)
+    cached = token_cache.get(token_hash)
+    if cached is not None:
+        return cached
+
+    auth_token = AuthToken.objects.select_related('user').filter(
+        token_hash=token_hash,
+        user__is_active=True
+    ).first()
+    if auth_token is None:
+        return None
+
+    token_cache.set(token_hash, auth_token.user, auth_token.expires)
+    return auth_token.user, auth_token.expires
+
+
+def revoke_token(token):
+    token_hash = hash_token(token)
+    token_cache.evict(token_hash)
+    AuthToken.objects.filter(token_hash=token_hash).delete()
+
+
+def purge_expired_tokens():
+    """Remove em lote as sessões expiradas."""
+    deleted, _ = AuthToken.objects.filter(expires__lte=timezone.now()).delete()
+    return deleted
+
+
+_last_purge = time.monotonic()
+_purge_lock = threading.Lock()
+
+
+def _purge_in_background():
+    try:
+        purge_expired_tokens()
+    except Exception:
+        logger.exception('Falha ao remover sessões expiradas')
+    finally:
+        connections.close_all()
+
+
+def schedule_token_purge():
+    """
+    Dispara, no máximo uma vez a cada PDV_TOKEN_PURGE_INTERVAL segundos por
+    processo, a limpeza das sessões expiradas em uma thread separada.
+    """
+    global _last_purge
+
+    interval = settings.PDV_TOKEN_PURGE_INTERVAL
+    if interval is None:
+        return
+    with _purge_lock:
+        if time.monotonic() - _last_purge < interval:
+            return
+        _last_purge = time.monotonic()
+    threading.Thread(target=_purge_in_background, daemon=True).start()
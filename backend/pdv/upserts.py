@@ -0,0 +1,30 @@
+from django.db import connection
+
+# Contadores somados no banco, sem leitura prévia: agregados diários das
+# vendas (pdv.rollups) e versões do cadastro (pdv.versions).
+
+
+def increment(model, key_fields, value_fields, rows):
+    """
+    Soma `rows` (tuplas com os valores de `key_fields` e depois os de
+    `value_fields`) aos contadores de `model` em um único INSERT ... ON
+    CONFLICT DO UPDATE (SQLite >= 3.24 e PostgreSQL): cria as linhas que
+    faltam e incrementa as existentes sem ler antes.
+    """
+    if not rows:
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    keys = [quote(model._meta.get_field(name).column) for name in key_fields]
+    values = [quote(model._meta.get_field(name).column) for name in value_fields]
+    placeholders = '(' + ', '.join(['%s'] * (len(keys) + len(values))) + ')'
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(keys + values)}) "
+        f"VALUES {', '.join([placeholders] * len(rows))} "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+        + ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in values)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [param for row in rows for param in row])
@@ -1,39 +1,55 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 from .views import logout_view, login
 
+# Sob ASGI as rotas de leitura usam as views assíncronas
+reads = async_views if settings.PDV_ASYNC_VIEWS else views
+
 urlpatterns = [
     # Autenticação e token
     path('login/', login, name='login'),
     path('logout/', logout_view, name='logout'),
-    path('token/check/', views.check_token),
+    path('token/check/', views.check_token, name='check_token'),
     
     # PDV
-    path('products/', views.get_products),
-    path('sales/create/', views.create_sale),
+    path('products/', reads.get_products, name='products'),
+    path('sales/create/', views.create_sale, name='create_sale'),
+    path('sales/sync/', views.sync_sales, name='sync_sales'),  # POST - vendas offline em lote
     
     # Estoque
-    path('inventory/', views.get_inventory),
-    path('batches/add/', views.add_batch),
+    path('inventory/', reads.get_inventory, name='inventory'),
+    path('batches/add/', views.add_batch, name='add_batch'),
+    path('receipts/', views.goods_receipt, name='goods_receipt'),  # POST - entrada com vários itens
     
     # Produtos
-    path('products/manage/', views.manage_product),
-    path('products/manage/<int:product_id>/', views.manage_product),
-    path('products/barcode/', views.product_by_barcode),  # POST
-    path('products/barcode/<str:barcode>/', views.product_by_barcode),  # GET, PUT, DELETE
+    path('products/manage/', views.manage_product, name='product_create'),
+    path('products/manage/<int:product_id>/', views.manage_product, name='product_detail'),
+    path('products/barcode/', reads.product_by_barcode, name='product_barcode_create'),  # POST
+    path('products/barcode/<str:barcode>/', reads.product_by_barcode, name='product_by_barcode'),  # GET, PUT, DELETE
+    path('products/import/', views.import_products, name='import_products'),  # POST - CSV, NDJSON ou JSON
+    path('catalog/changes/', reads.catalog_changes, name='catalog_changes'),  # ?since=<sequência>
     
     # Relatórios
-    path('reports/sales/', views.sales_report),
-    path('reports/inventory/', views.inventory_report),
+    path('reports/sales/', reads.sales_report, name='sales_report'),
+    path('reports/inventory/', reads.inventory_report, name='inventory_report'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics_view, name='metrics'),  # formato Prometheus
+    path('profiles/', views.list_profiles, name='profiles'),  # só administradores
+    path('profiles/<str:profile_id>/', views.get_profile, name='profile_detail'),  # ?format=pstats
+    
+    # Exportações (?from=&to=&format=csv|ndjson&gzip=1)
+    path('exports/sales/', views.export_sales, name='export_sales'),
+    path('exports/sale-items/', views.export_sale_items, name='export_sale_items'),
     
     # Auxiliares
     # Categorias
-    path('categories/', views.list_categories),
-    path('categories/manage/', views.manage_category),  # POST
-    path('categories/manage/<int:category_id>/', views.manage_category),  # GET, PUT, DELETE
+    path('categories/', reads.list_categories, name='categories'),
+    path('categories/manage/', views.manage_category, name='category_create'),  # POST
+    path('categories/manage/<int:category_id>/', views.manage_category, name='category_detail'),  # GET, PUT, DELETE
 
     # Métodos de Pagamento
-    path('payment-methods/', views.list_payment_methods),
-    path('payment-methods/manage/', views.manage_payment_method),  # POST
-    path('payment-methods/manage/<int:method_id>/', views.manage_payment_method),  # GET, PUT, DELETE
+    path('payment-methods/', reads.list_payment_methods, name='payment_methods'),
+    path('payment-methods/manage/', views.manage_payment_method, name='payment_method_create'),  # POST
+    path('payment-methods/manage/<int:method_id>/', views.manage_payment_method, name='payment_method_detail'),  # GET, PUT, DELETE
 ]
\ No newline at end of file
@@ -0,0 +1,146 @@
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .models import CatalogChange, CatalogVersion, Category, PaymentMethod, Product
+from .upserts import increment
+
+# Versões dos cadastros que os terminais baixam. Toda escrita (views, admin,
+# importação) passa por record(), na mesma transação:
+#   - incrementa o contador do tipo; as listagens respondem com um ETag
+#     derivado dele e devolvem 304 para If-None-Match sem consultar as
+#     tabelas do cadastro;
+#   - registra o item no log de alterações (CatalogChange) com a próxima
+#     sequência global, de onde os terminais puxam só o que mudou desde a
+#     última sincronização (changes_since).
+
+PRODUCTS = 'products'
+CATEGORIES = 'categories'
+PAYMENT_METHODS = 'payment_methods'
+
+# Contador da sequência do log de alterações
+SEQUENCE = 'changes'
+
+KINDS = {
+    Product: PRODUCTS,
+    Category: CATEGORIES,
+    PaymentMethod: PAYMENT_METHODS,
+}
+
+# Campos enviados na sincronização incremental; o terminal junta produtos e
+# categorias localmente, então renomear uma categoria não reenvia os produtos
+CHANGE_FIELDS = {
+    PRODUCTS: (Product, ('id', 'name', 'price', 'barcode', 'category_id')),
+    CATEGORIES: (Category, ('id', 'name')),
+    PAYMENT_METHODS: (PaymentMethod, ('id', 'name')),
+}
+
+
+@transaction.atomic
+def record(kind, ids, deleted=False):
+    """
+    Registra alteração (ou exclusão) dos itens `ids` do tipo `kind`. O
+    contador da sequência fica travado até o commit, então as sequências
+    são confirmadas em ordem e um terminal nunca pula uma alteração.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+
+    # Sempre na mesma ordem de chaves, para não haver deadlock no PostgreSQL
+    increment(CatalogVersion, ['kind'], ['version'], sorted([(kind, 1), (SEQUENCE, len(ids))]))
+    last = CatalogVersion.objects.values_list('version', flat=True).get(kind=SEQUENCE)
+
+    CatalogChange.objects.bulk_create(
+        [
+            CatalogChange(seq=seq, kind=kind, object_id=object_id, deleted=deleted)
+            for seq, object_id in enumerate(ids, last - len(ids) + 1)
+        ],
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['seq', 'deleted'],
+        batch_size=1000
+    )
+
+
+def changes_since(since, limit):
+    """
+    Até `limit` alterações com sequência maior que `since`: os itens
+    alterados, por tipo, com os dados atuais, e os ids excluídos. O cliente
+    guarda next_since e repete enquanto has_more.
+    """
+    entries = list(
+        CatalogChange.objects.filter(seq__gt=since).order_by('seq')
+        .values_list('seq', 'kind', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = defaultdict(list)
+    deleted = {kind: [] for kind in CHANGE_FIELDS}
+    for _, kind, object_id, is_deleted in entries:
+        (deleted if is_deleted else changed)[kind].append(object_id)
+
+    # Um item alterado de novo ou excluído depois da leitura do log volta
+    # com sequência maior na próxima página
+    changes = {kind: [] for kind in CHANGE_FIELDS}
+    for kind, ids in changed.items():
+        model, fields = CHANGE_FIELDS[kind]
+        changes[kind] = list(model.objects.filter(pk__in=ids).order_by('pk').values(*fields))
+
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'next_since': entries[-1][0] if entries else since,
+        'has_more': has_more,
+    }
+
+
+def current_etag(kinds):
+    versions = dict(CatalogVersion.objects.filter(kind__in=kinds).values_list('kind', 'version'))
+    return '"' + '-'.join(f'{kind}.{versions.get(kind, 0)}' for kind in kinds) + '"'
+
+
+def _not_modified(request, etag):
+    tags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in tags or '*' in tags:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return None
+
+
+def _tagged(response, etag):
+    if response.status_code == 200:
+        response['ETag'] = etag
+    return response
+
+
+def etag(*kinds):
+    """
+    Decorador de listagens (views síncronas ou assíncronas): ETag pelas
+    versões de `kinds` e 304 para If-None-Match igual. A versão é lida antes
+    dos dados, então uma escrita concorrente nunca fica escondida atrás de
+    um ETag novo.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                tag = await sync_to_async(current_etag)(kinds)
+                return _not_modified(request, tag) or _tagged(await view(request, *args, **kwargs), tag)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(request, *args, **kwargs)
+                tag = current_etag(kinds)
+                return _not_modified(request, tag) or _tagged(view(request, *args, **kwargs), tag)
+        return wrapper
+    return decorator
@@ -1,15 +1,23 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.contrib.auth import authenticate, login as django_login
+from django.contrib.auth import authenticate, logout as django_logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.db import transaction
-from django.db.models import Sum, F, Count
-from datetime import datetime, timedelta
+from django.db import IntegrityError
 from .models import *
+from . import catalog_cache, exports, metrics, params, profiling, queries, versions
+from .catalog_import import CatalogImportError, import_catalog
+from .pagination import InvalidCursor, paginate
+from .rollups import sales_summary
+from .sales import commit_sales, sale_response, stored_response, validate_idempotency_key
+from .search import search_products
+from .stock import ReceiptError, receive_goods
+from .tokens import issue_token, revoke_token
+from .writer import write_sale
 import json
-import secrets
 
 # Autenticação
 @csrf_exempt
@@ -23,18 +31,13 @@ def login(request):
             user = authenticate(username=username, password=password)
             
             if user:
-                # Gera novo token
-                token = secrets.token_hex(20)
-                user.auth_token = token
-                user.token_expires = datetime.now() + timedelta(hours=8)
-                user.save()
-                
-                # Autentica o usuário na sessão do Django
-                django_login(request, user)
+                # Nova sessão na tabela de tokens; não altera o registro do usuário
+                token, expires = issue_token(user)
                 
                 return JsonResponse({
                     'status': 'success',
                     'token': token,
+                    'expires': expires.isoformat(),
                     'user': {
                         'username': user.username,
                         'name': user.name,
@@ -74,9 +77,11 @@ def logout_view(request):
         }, status=401)
     
     try:
-        # Limpa o token do usuário
-        request.user.auth_token = None
-        request.user.save()
+        # Encerra apenas a sessão deste terminal
+        if getattr(request, 'auth_token', None):
+            revoke_token(request.auth_token)
+        else:
+            django_logout(request)
         
         return JsonResponse({
             'status': 'success',
@@ -91,10 +96,11 @@ def logout_view(request):
 @csrf_exempt
 def check_token(request):
     if request.method == 'GET':
+        expires = getattr(request, 'auth_token_expires', None)
         return JsonResponse({
             'status': 'success',
-            'token': request.user.auth_token,
-            'expires': request.user.token_expires.isoformat(),
+            'token': getattr(request, 'auth_token', None),
+            'expires': expires.isoformat() if expires else None,
             'user': {
                 'username': request.user.username,
                 'name': request.user.name,
@@ -105,74 +111,100 @@ def check_token(request):
 
 # Operações de PDV
 @csrf_exempt
+@versions.etag(versions.PRODUCTS, versions.CATEGORIES)
 def get_products(request):
-    search = request.GET.get('search', '')
-    products = Product.objects.filter(
-        name__icontains=search
-    ).values('id', 'name', 'price', 'barcode', 'category__name')
-    return JsonResponse(list(products), safe=False)
+    search = request.GET.get('search', '').strip()
+    
+    # Busca indexada (FTS5/pg_trgm) por nome, código de barras e categoria,
+    # por relevância: uma única página
+    if search:
+        limit = params.limit(request, settings.PDV_SEARCH_LIMIT, settings.PDV_SEARCH_MAX_LIMIT)
+        return JsonResponse({'results': search_products(search, limit), 'next_cursor': None})
+    
+    try:
+        page = paginate(request, queries.products())
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
+    return JsonResponse(page)
+
+def catalog_changes(request):
+    # Sincronização incremental do cadastro: alterações e exclusões com
+    # sequência maior que ?since= (0 para a carga completa)
+    try:
+        since = params.since(request)
+    except ValueError:
+        return params.invalid_since()
+    limit = params.limit(request, settings.PDV_CATALOG_CHANGES_LIMIT, settings.PDV_CATALOG_CHANGES_MAX_LIMIT)
+    return JsonResponse(versions.changes_since(since, limit))
+
+def _replay(response):
+    replay = JsonResponse(response)
+    replay['Idempotent-Replayed'] = 'true'
+    return replay
 
 @csrf_exempt
-@transaction.atomic
 def create_sale(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            user = User.objects.get(username=data['username'])
             
-            # Criar a venda
-            sale = Sale.objects.create(
-                user=user,
-                payment_method=PaymentMethod.objects.get(id=data['payment_method_id']),
-                discount=data.get('discount', 0),
-                addition=data.get('addition', 0),
-                total_amount=0  # Será calculado
+            # Reenvio com a mesma chave devolve a resposta original
+            idempotency_key = validate_idempotency_key(
+                request.headers.get('Idempotency-Key', data.get('idempotency_key'))
             )
+            if idempotency_key:
+                response = stored_response(idempotency_key)
+                if response is not None:
+                    return _replay(response)
             
-            total = 0
-            # Processar cada item
-            for item in data['items']:
-                product = Product.objects.get(id=item['product_id'])
-                unit_price = product.price
-                quantity = item['quantity']
-                item_total = unit_price * quantity
-                
-                # Registrar item da venda
-                SaleItem.objects.create(
-                    sale=sale,
-                    product=product,
-                    units=quantity,
-                    unit_price=unit_price,
-                    total_price=item_total
+            user = User.objects.get(username=data['username'])
+            payment_method = PaymentMethod.objects.get(id=data['payment_method_id'])
+            
+            # Venda, itens e baixa de estoque (FIFO) em uma única transação,
+            # agrupada com outras vendas se o escritor único estiver ligado
+            try:
+                sale = write_sale(
+                    user,
+                    payment_method,
+                    data['items'],
+                    discount=data.get('discount', 0),
+                    addition=data.get('addition', 0),
+                    idempotency_key=idempotency_key
                 )
-                
-                # Atualizar estoque (FIFO)
-                batches = Batch.objects.filter(
-                    product=product
-                ).order_by('inclusion_date')
-                
-                remaining = quantity
-                for batch in batches:
-                    inventory = Inventory.objects.get(product=product, batch=batch)
-                    if inventory.quantity >= remaining:
-                        inventory.quantity -= remaining
-                        inventory.save()
-                        break
-                    else:
-                        remaining -= inventory.quantity
-                        inventory.quantity = 0
-                        inventory.save()
-                
-                total += item_total
+            except IntegrityError:
+                # Reenvio concorrente gravou a mesma chave primeiro
+                response = idempotency_key and stored_response(idempotency_key)
+                if response:
+                    return _replay(response)
+                raise
             
-            # Atualizar total da venda
-            sale.total_amount = total - sale.discount + sale.addition
-            sale.save()
+            return JsonResponse(sale_response(sale))
+        except Exception as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+    return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+@csrf_exempt
+def sync_sales(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            sales = data['sales']
+            if not isinstance(sales, list) or not all(isinstance(sale, dict) for sale in sales):
+                raise ValueError('O campo sales deve ser uma lista de vendas')
+            if len(sales) > settings.PDV_SALE_SYNC_MAX_SALES:
+                raise ValueError(f'Máximo de {settings.PDV_SALE_SYNC_MAX_SALES} vendas por requisição')
+            
+            # Cada venda tem seu próprio resultado; falhas não abortam o lote
+            results = commit_sales(sales, settings.PDV_SALE_SYNC_CHUNK_SIZE)
             
             return JsonResponse({
                 'status': 'success',
-                'sale_id': sale.id,
-                'total': sale.total_amount
+                'created': sum(1 for result in results if result['status'] == 'success'),
+                'failed': sum(1 for result in results if result['status'] == 'error'),
+                'results': results
             })
         except Exception as e:
             return JsonResponse({
@@ -187,53 +219,56 @@ def add_batch(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            product = Product.objects.get(id=data['product_id'])
             
-            # Criar lote
-            batch = Batch.objects.create(
-                product=product,
-                quantity=data['quantity'],
-                expiration_date=data.get('expiration_date')
-            )
+            # Entrada de uma linha só: lote, inventário e saldo do produto
+            batch, = receive_goods([{
+                'product_id': data['product_id'],
+                'quantity': data['quantity'],
+                'expiration_date': data.get('expiration_date')
+            }])
             
-            # Criar/atualizar inventário
-            inventory, created = Inventory.objects.get_or_create(
-                product=product,
-                batch=batch,
-                defaults={'quantity': data['quantity']}
-            )
+            return JsonResponse({'status': 'success', 'batch_id': batch.id})
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
+@csrf_exempt
+def goods_receipt(request):
+    # Entrada de mercadoria com várias linhas (product_id ou barcode,
+    # quantity, expiration_date) em uma única transação
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            lines = data['lines']
+            if isinstance(lines, list) and len(lines) > settings.PDV_RECEIPT_MAX_LINES:
+                raise ReceiptError(f'Máximo de {settings.PDV_RECEIPT_MAX_LINES} itens por entrada')
             
-            if not created:
-                inventory.quantity += data['quantity']
-                inventory.save()
+            batches = receive_goods(lines)
             
-            return JsonResponse({'status': 'success', 'batch_id': batch.id})
+            return JsonResponse({
+                'status': 'success',
+                'products': len({batch.product_id for batch in batches}),
+                'units': sum(batch.quantity for batch in batches),
+                'batches': [
+                    {'line': number, 'batch_id': batch.id, 'product_id': batch.product_id}
+                    for number, batch in enumerate(batches, 1)
+                ]
+            })
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
 
 def get_inventory(request):
     product_id = request.GET.get('product_id')
-    if product_id:
-        inventory = Inventory.objects.filter(
-            product_id=product_id,
-            quantity__gt=0
-        ).values(
-            'batch__id',
-            'batch__inclusion_date',
-            'batch__expiration_date',
-            'quantity'
-        )
-        return JsonResponse(list(inventory), safe=False)
-    
-    # Resumo geral
-    inventory = Product.objects.annotate(
-        total_quantity=Sum('inventory__quantity')
-    ).filter(
-        total_quantity__gt=0
-    ).values('id', 'name', 'total_quantity')
-    
-    return JsonResponse(list(inventory), safe=False)
+    try:
+        if product_id:
+            inventory = queries.inventory_batches(product_id)
+            return JsonResponse(paginate(request, inventory, key='batch_id', row_key='batch__id'))
+        
+        # Resumo geral
+        return JsonResponse(paginate(request, queries.inventory_summary()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
 
 # Gestão de Produtos
 @csrf_exempt
@@ -246,7 +281,9 @@ def manage_product(request, product_id=None):
                 'name': product.name,
                 'price': str(product.price),
                 'barcode': product.barcode,
-                'category_id': product.category.id
+                'category_id': product.category.id,
+                'stock': product.stock,
+                'reorder_level': product.reorder_level
             })
     
         elif request.method == 'POST':
@@ -257,13 +294,15 @@ def manage_product(request, product_id=None):
                 product.price = data['price']
                 product.barcode = data.get('barcode')
                 product.category_id = data['category_id']
+                product.reorder_level = data.get('reorder_level', product.reorder_level)
                 product.save()
             else:  # Criação
                 product = Product.objects.create(
                     name=data['name'],
                     price=data['price'],
                     barcode=data.get('barcode'),
-                    category_id=data['category_id']
+                    category_id=data['category_id'],
+                    **({'reorder_level': data['reorder_level']} if 'reorder_level' in data else {})
                 )
             return JsonResponse({'status': 'success', 'product_id': product.id})
         
@@ -289,15 +328,7 @@ def product_by_barcode(request, barcode=None):
     try:
         # GET - Buscar produto por código de barras
         if request.method == 'GET':
-            product = Product.objects.get(barcode=barcode)
-            return JsonResponse({
-                'id': product.id,
-                'name': product.name,
-                'price': str(product.price),
-                'barcode': product.barcode,
-                'category_id': product.category.id,
-                'category_name': product.category.name
-            })
+            return JsonResponse(catalog_cache.get_by_barcode(barcode))
         
         # POST - Criar novo produto com código de barras
         elif request.method == 'POST':
@@ -362,71 +393,115 @@ def product_by_barcode(request, barcode=None):
             'message': str(e)
         }, status=400)
 
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/json': 'json',
+}
+
+@csrf_exempt
+def import_products(request):
+    # Corpo lido em streaming (não usa request.body); formato pelo
+    # Content-Type ou ?format=csv|ndjson|json
+    if request.method == 'POST':
+        fmt = request.GET.get('format') or IMPORT_FORMATS.get(request.content_type)
+        try:
+            summary = import_catalog(request, fmt)
+        except CatalogImportError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', **summary})
+    return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405)
+
 # Relatórios
 def sales_report(request):
-    date_from = request.GET.get('from', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
-    date_to = request.GET.get('to', datetime.now().strftime('%Y-%m-%d'))
-    
-    # Vendas por período
-    sales = Sale.objects.filter(
-        sale_datetime__date__gte=date_from,
-        sale_datetime__date__lte=date_to
-    ).values('sale_datetime__date').annotate(
-        total=Sum('total_amount'),
-        count=Count('id')
-    ).order_by('sale_datetime__date')
-    
-    # Métodos de pagamento
-    payment_methods = Sale.objects.filter(
-        sale_datetime__date__gte=date_from,
-        sale_datetime__date__lte=date_to
-    ).values('payment_method__name').annotate(
-        total=Sum('total_amount'),
-        count=Count('id')
-    )
+    try:
+        date_from, date_to, *period = params.period(request)
+    except ValueError:
+        return params.invalid_period()
     
-    # Produtos mais vendidos
-    top_products = SaleItem.objects.filter(
-        sale__sale_datetime__date__gte=date_from,
-        sale__sale_datetime__date__lte=date_to
-    ).values('product__name').annotate(
-        total_units=Sum('units'),
-        total_value=Sum('total_price')
-    ).order_by('-total_value')[:10]
+    # Dias encerrados vêm dos agregados diários; apenas o dia atual das vendas
+    report = sales_summary(*period)
     
     return JsonResponse({
         'period': {'from': date_from, 'to': date_to},
-        'sales_by_date': list(sales),
-        'payment_methods': list(payment_methods),
-        'top_products': list(top_products)
+        **report
     })
 
-def inventory_report(request):
-    # Produtos com estoque baixo (menos de 10 unidades)
-    low_stock = Inventory.objects.values(
-        'product__name'
-    ).annotate(
-        total=Sum('quantity')
-    ).filter(
-        total__lt=10
-    ).order_by('total')
-    
-    # Produtos próximos de vencer (7 dias)
-    expiring = Batch.objects.filter(
-        expiration_date__lte=datetime.now().date() + timedelta(days=7),
-        expiration_date__gte=datetime.now().date()
-    ).values(
-        'product__name',
-        'expiration_date'
-    ).annotate(
-        quantity=Sum('inventory__quantity')
-    ).order_by('expiration_date')
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+def _export(request, name, rows, columns):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Formato deve ser csv ou ndjson'
+        }, status=400)
+    try:
+        date_from, date_to, *period = params.period(request)
+    except ValueError:
+        return params.invalid_period()
     
+    compress = request.GET.get('gzip') in ('1', 'true')
+    filename = f'{name}_{date_from}_{date_to}.{fmt}'
+    blocks = exports.stream(rows(*period), columns, fmt, compress)
+    if isinstance(request, ASGIRequest):
+        # Iterador assíncrono: com o síncrono, o Django leria o período todo antes de enviar
+        blocks = exports.astream(blocks)
+    response = StreamingHttpResponse(
+        blocks,
+        content_type='application/gzip' if compress else EXPORT_CONTENT_TYPES[fmt]
+    )
+    if compress:
+        filename += '.gz'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def export_sales(request):
+    return _export(request, 'vendas', exports.sales_rows, exports.SALE_COLUMNS)
+
+def export_sale_items(request):
+    return _export(request, 'itens_venda', exports.sale_items_rows, exports.SALE_ITEM_COLUMNS)
+
+def inventory_report(request):
     return JsonResponse({
-        'low_stock': list(low_stock),
-        'expiring_soon': list(expiring)
+        'low_stock': list(queries.low_stock()),
+        'expiring_soon': list(queries.expiring_soon())
     })
 
+def cache_stats(request):
+    return JsonResponse({'barcode': catalog_cache.stats()})
+
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _forbidden_unless_admin(request):
+    if not (request.user.is_authenticated and request.user.is_admin):
+        return JsonResponse({'status': 'error', 'message': 'Acesso restrito a administradores'}, status=403)
+    return None
+
+def list_profiles(request):
+    forbidden = _forbidden_unless_admin(request)
+    if forbidden:
+        return forbidden
+    return JsonResponse({'results': profiling.list_profiles()})
+
+def get_profile(request, profile_id):
+    forbidden = _forbidden_unless_admin(request)
+    if forbidden:
+        return forbidden
+
+    # Resumo em texto ou o pstats binário (python -m pstats, snakeviz)
+    binary = request.GET.get('format') == 'pstats'
+    path = profiling.profile_path(profile_id, '.prof' if binary else '.txt')
+    if path is None:
+        return JsonResponse({'status': 'error', 'message': 'Perfil não encontrado'}, status=404)
+    if binary:
+        return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
+    return HttpResponse(path.read_text(), content_type='text/plain; charset=utf-8')
+
 # Dados auxiliares
 @csrf_exempt
 def manage_category(request, category_id=None):
@@ -479,10 +554,13 @@ def manage_category(request, category_id=None):
 
 
 @csrf_exempt
+@versions.etag(versions.CATEGORIES)
 def list_categories(request):
-    # Listar todas as categorias
-    categories = Category.objects.all().values('id', 'name')
-    return JsonResponse(list(categories), safe=False)
+    # Listar categorias, paginadas por id
+    try:
+        return JsonResponse(paginate(request, queries.categories()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
 
 @csrf_exempt
 def manage_payment_method(request, method_id=None):
@@ -534,7 +612,10 @@ def manage_payment_method(request, method_id=None):
         }, status=404)
 
 @csrf_exempt
+@versions.etag(versions.PAYMENT_METHODS)
 def list_payment_methods(request):
-    # Listar todos os métodos
-    methods = PaymentMethod.objects.all().values('id', 'name')
-    return JsonResponse(list(methods), safe=False)
\ No newline at end of file
+    # Listar métodos, paginados por id
+    try:
+        return JsonResponse(paginate(request, queries.payment_methods()))
+    except InvalidCursor as e:
+        return params.invalid_cursor(e)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .sales import commit_sale
+
+# No SQLite, transações de venda concorrentes disputam o único lock de
+# escrita do banco. Com PDV_SALE_WRITER, as vendas de todas as threads do
+# processo passam por um único escritor, que grava várias vendas em uma só
+# transação (group commit): um fsync por lote em vez de um por venda.
+#
+# O escritor é por processo; sob gunicorn, use um worker com várias threads
+# para que todas as vendas compartilhem a mesma fila.
+
+_STOP = object()
+
+
+class SaleWriter:
+    def __init__(self, max_batch, max_wait_ms):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'batches': 0, 'sales': 0}
+
+    def submit(self, user, payment_method, items, **kwargs):
+        """
+        Enfileira uma venda (mesmos argumentos de commit_sale()) e devolve um
+        Future, resolvido com a Sale depois do commit do lote ou com a exceção
+        da venda.
+        """
+        self._start()
+        future = Future()
+        self._queue.put((future, (user, payment_method, items), kwargs))
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pdv-sale-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                jobs = self._collect()
+                if jobs:
+                    close_old_connections()
+                    self._write([job for job in jobs if job is not _STOP])
+                if _STOP in jobs:
+                    return
+        finally:
+            connection.close()
+
+    def _collect(self):
+        # Bloqueia até a primeira venda e espera no máximo max_wait pelas seguintes
+        jobs = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(jobs) < self.max_batch and jobs[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                jobs.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _write(self, jobs):
+        jobs = [job for job in jobs if job[0].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, args, kwargs in jobs:
+                    # commit_sale() roda em um savepoint; uma venda rejeitada
+                    # não desfaz as outras do lote
+                    try:
+                        outcomes.append((future, commit_sale(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # Falha no commit do lote: nenhuma venda foi gravada
+            for future, _, _ in jobs:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['sales'] += sum(1 for _, _, error in outcomes if error is None)
+
+        for future, sale, error in outcomes:
+            if error is None:
+                future.set_result(sale)
+            else:
+                future.set_exception(error)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def sale_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SaleWriter(settings.PDV_SALE_WRITER_MAX_BATCH, settings.PDV_SALE_WRITER_MAX_WAIT_MS)
+        return _writer
+
+
+def write_sale(user, payment_method, items, **kwargs):
+    """commit_sale() pelo escritor único quando PDV_SALE_WRITER está ligado."""
+    if not settings.PDV_SALE_WRITER:
+        return commit_sale(user, payment_method, items, **kwargs)
+    return sale_writer().submit(user, payment_method, items, **kwargs).result()
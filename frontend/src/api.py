@@ -0,0 +1,152 @@
+import asyncio
+import os
+
+import httpx
+
+# Cliente HTTP assíncrono compartilhado pelo aplicativo: um único
+# httpx.AsyncClient (conexões persistentes, keep-alive) no event loop do
+# Flet, com o token Bearer da sessão em toda requisição. GETs idênticos em
+# andamento (bipagens repetidas, buscas de digitação) viram uma só
+# requisição, e uma busca nova cancela a anterior ainda sem resposta.
+
+API_URL = os.environ.get('PDV_API_URL', 'http://127.0.0.1:8000')
+
+MAX_CONNECTIONS = 10
+MAX_KEEPALIVE_CONNECTIONS = 5
+# Conexões ociosas ficam abertas entre bipagens espaçadas
+KEEPALIVE_EXPIRY = 60
+TIMEOUT = httpx.Timeout(15, connect=5)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class SessionExpired(ApiError):
+    pass
+
+
+class BearerAuth(httpx.Auth):
+    # Lê o token a cada requisição: login e logout valem para as próximas
+    def __init__(self, api):
+        self.api = api
+
+    def auth_flow(self, request):
+        if self.api.token:
+            request.headers['Authorization'] = f'Bearer {self.api.token}'
+        yield request
+
+
+def _check(response):
+    if response.status_code < 400:
+        return response.json()
+    try:
+        message = response.json().get('message', response.reason_phrase)
+    except ValueError:
+        message = response.reason_phrase
+    if response.status_code == 401:
+        raise SessionExpired(401, message)
+    raise ApiError(response.status_code, message)
+
+
+class ApiClient:
+    def __init__(self, base_url, token=None, transport=None):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.transport = transport
+        self._client = None
+        # GETs em andamento: chave -> [tarefa, quantos aguardam]
+        self._inflight = {}
+        # Última requisição de cada campo de digitação
+        self._latest = {}
+
+    @property
+    def client(self):
+        # Criado no primeiro uso, já dentro do event loop do aplicativo
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=BearerAuth(self),
+                timeout=TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        for task, _ in list(self._inflight.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, path, params=None):
+        """
+        GET com o JSON da resposta. Quem pede o mesmo caminho e parâmetros
+        enquanto a primeira requisição não volta aguarda a mesma resposta; a
+        requisição só é cancelada se todos os interessados desistirem.
+        """
+        key = (path, tuple(sorted((params or {}).items())), self.token)
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = [asyncio.ensure_future(self.client.get(path, params=params)), 0]
+            entry[0].add_done_callback(lambda _, entry=entry: self._forget(key, entry))
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            response = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1:
+                # Último interessado: interrompe a requisição
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+        return _check(response)
+
+    def _forget(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def latest(self, slot, path, params=None):
+        """
+        GET em que só a requisição mais recente de `slot` (ex.: o campo de
+        busca) importa: a anterior ainda em andamento é cancelada. Devolve
+        None para a requisição substituída.
+        """
+        previous = self._latest.get(slot)
+        if previous is not None and not previous.done():
+            previous.cancel()
+
+        task = self._latest[slot] = asyncio.ensure_future(self.get(path, params))
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled() and self._latest.get(slot) is not task:
+                return None
+            raise
+        finally:
+            if self._latest.get(slot) is task:
+                del self._latest[slot]
+
+    async def post(self, path, json):
+        return _check(await self.client.post(path, json=json))
+
+
+_shared = None
+
+
+def shared():
+    """O cliente do aplicativo, criado no primeiro uso."""
+    global _shared
+    if _shared is None:
+        _shared = ApiClient(API_URL)
+    return _shared
@@ -0,0 +1,200 @@
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Cópia local do cadastro e fila de vendas do terminal, em SQLite. A bipagem
+# consulta só o banco local (índice por código de barras), sem ida à rede;
+# vendas ficam na fila até o envio pelo SyncWorker, mesmo com o backend fora
+# do ar ou o aplicativo fechado.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    price TEXT NOT NULL,
+    barcode TEXT,
+    category_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS products_barcode ON products (barcode);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS payment_methods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+-- status: pending (aguardando envio) ou failed (recusada pelo backend)
+CREATE TABLE IF NOT EXISTS sales (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS sales_status ON sales (status, created);
+"""
+
+# Colunas por tipo do cadastro, na ordem da resposta de /api/catalog/changes/
+CATALOG_COLUMNS = {
+    'products': ('id', 'name', 'price', 'barcode', 'category_id'),
+    'categories': ('id', 'name'),
+    'payment_methods': ('id', 'name'),
+}
+
+
+class LocalStore:
+    def __init__(self, path):
+        # Uma conexão compartilhada pela interface e pelo SyncWorker,
+        # serializada pelo lock; transações abertas explicitamente
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            self.db.execute('PRAGMA journal_mode = WAL')
+            self.db.execute('PRAGMA synchronous = NORMAL')
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    # Metadados: sequência do cadastro e sessão
+
+    def get_meta(self, key, default=None):
+        rows = self._query('SELECT value FROM meta WHERE key = ?', (key,))
+        return json.loads(rows[0]['value']) if rows else default
+
+    def set_meta(self, key, value):
+        with self.transaction() as db:
+            if value is None:
+                db.execute('DELETE FROM meta WHERE key = ?', (key,))
+            else:
+                db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def catalog_since(self):
+        return self.get_meta('catalog_since', 0)
+
+    def catalog_loaded(self):
+        # Carga completa concluída ao menos uma vez
+        return self.get_meta('catalog_loaded', False)
+
+    # Cadastro
+
+    def apply_changes(self, page):
+        """
+        Aplica uma página de /api/catalog/changes/ e avança a sequência na
+        mesma transação: se o aplicativo fechar no meio, a próxima
+        sincronização recomeça da última página aplicada.
+        """
+        with self.transaction() as db:
+            for kind, columns in CATALOG_COLUMNS.items():
+                rows = page['changes'].get(kind, [])
+                if rows:
+                    db.executemany(
+                        f'INSERT OR REPLACE INTO {kind} ({", ".join(columns)}) '
+                        f'VALUES ({", ".join("?" * len(columns))})',
+                        [tuple(row[column] for column in columns) for row in rows]
+                    )
+                deleted = page['deleted'].get(kind, [])
+                if deleted:
+                    db.executemany(f'DELETE FROM {kind} WHERE id = ?', [(object_id,) for object_id in deleted])
+
+            db.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('catalog_since', json.dumps(page['next_since']))
+            )
+            if not page['has_more']:
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('catalog_loaded', 'true')")
+
+    def product_by_barcode(self, barcode):
+        rows = self._query(
+            'SELECT p.id, p.name, p.price, p.barcode, c.name AS category_name '
+            'FROM products p LEFT JOIN categories c ON c.id = p.category_id '
+            'WHERE p.barcode = ? ORDER BY p.id LIMIT 1',
+            (barcode,)
+        )
+        return dict(rows[0]) if rows else None
+
+    def search(self, text, limit):
+        # Busca simples por nome, usada quando o backend está fora do ar
+        rows = self._query(
+            'SELECT p.id, p.name, p.price, p.barcode, c.name AS category_name '
+            'FROM products p LEFT JOIN categories c ON c.id = p.category_id '
+            "WHERE p.name LIKE ? ESCAPE '\\' ORDER BY p.name LIMIT ?",
+            ('%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%', limit)
+        )
+        return [dict(row) for row in rows]
+
+    def payment_methods(self):
+        return [dict(row) for row in self._query('SELECT id, name FROM payment_methods ORDER BY name')]
+
+    def product_count(self):
+        return self._query('SELECT COUNT(*) FROM products')[0][0]
+
+    # Fila de vendas
+
+    def enqueue_sale(self, payload):
+        """Guarda a venda para envio; a chave também é a chave de idempotência no backend."""
+        key = str(uuid.uuid4())
+        payload = dict(payload, idempotency_key=key)
+        with self.transaction() as db:
+            db.execute(
+                'INSERT INTO sales (key, payload, created) VALUES (?, ?, ?)',
+                (key, json.dumps(payload), datetime.now(timezone.utc).isoformat())
+            )
+        return key
+
+    def pending_sales(self, limit):
+        rows = self._query(
+            "SELECT key, payload FROM sales WHERE status = 'pending' ORDER BY created LIMIT ?", (limit,)
+        )
+        return [(row['key'], json.loads(row['payload'])) for row in rows]
+
+    def finish_sales(self, keys, results):
+        """
+        Resultado de /api/sales/sync/, na ordem de `keys`: vendas gravadas
+        (ou reenviadas) saem da fila; recusadas ficam como failed, com o
+        motivo, para conferência no caixa.
+        """
+        with self.transaction() as db:
+            for key, result in zip(keys, results):
+                if result.get('status') == 'success':
+                    db.execute('DELETE FROM sales WHERE key = ?', (key,))
+                else:
+                    db.execute(
+                        "UPDATE sales SET status = 'failed', error = ? WHERE key = ?",
+                        (result.get('message', ''), key)
+                    )
+
+    def sale_counts(self):
+        rows = self._query('SELECT status, COUNT(*) FROM sales GROUP BY status')
+        counts = {'pending': 0, 'failed': 0}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
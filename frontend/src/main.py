@@ -1,26 +1,291 @@
+import os
+from decimal import Decimal
+from pathlib import Path
+from urllib.parse import quote
+
 import flet as ft
+import httpx
+
+import api
+from api import ApiError
+from local_store import LocalStore
+from sync import SyncWorker
+
+# Terminal de caixa offline-first: bipagens resolvidas no SQLite local,
+# vendas gravadas na fila local e enviadas em segundo plano. A janela abre
+# antes de qualquer acesso à rede; o cadastro chega depois, pelo SyncWorker.
+
+SEARCH_MIN_LENGTH = 2
+SEARCH_LIMIT = 8
+
+
+def data_path():
+    # Diretório de dados do aplicativo empacotado pelo Flet, ou ~/.dolphinpdv
+    directory = Path(os.environ.get('PDV_DATA_DIR') or os.environ.get('FLET_APP_STORAGE_DATA')
+                     or Path.home() / '.dolphinpdv')
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / 'terminal.sqlite3'
+
+
+def money(value):
+    return f'R$ {Decimal(value):.2f}'.replace('.', ',')
+
+
+class Terminal:
+    def __init__(self, page, store, client):
+        self.page = page
+        self.store = store
+        self.api = client
+        self.session = store.get_meta('session')
+        self.api.token = self.session and self.session['token']
+        self.online = True
+        # Carrinho: product_id -> {'product': ..., 'quantity': ...}
+        self.cart = {}
+        self.worker = SyncWorker(store, client, on_status=self.show_status)
+
+        self.barcode = ft.TextField(label='Código de barras', autofocus=True, on_submit=self.scan, expand=True)
+        self.search = ft.TextField(label='Buscar produto', on_change=self.search_products, expand=True)
+        self.suggestions = ft.Column(spacing=0)
+        self.items = ft.ListView(expand=True, spacing=4)
+        self.total = ft.Text(money(0), size=32, weight=ft.FontWeight.BOLD)
+        self.payment_method = ft.Dropdown(label='Pagamento', width=240)
+        self.status = ft.Text('Sincronizando...', size=12, color=ft.Colors.GREY_700)
+
+        self.username = ft.TextField(label='Usuário', autofocus=True)
+        self.password = ft.TextField(label='Senha', password=True, can_reveal_password=True, on_submit=self.login)
+        self.login_error = ft.Text(color=ft.Colors.RED)
+
+    def start(self):
+        self.page.title = 'Dolphin PDV'
+        if self.session:
+            self.show_terminal()
+        else:
+            self.show_login()
+        # Primeira sincronização só depois do primeiro quadro
+        self.worker.start()
+
+    # Sessão
+
+    def show_login(self):
+        self.page.controls.clear()
+        self.page.add(ft.Column([
+            ft.Text('Dolphin PDV', size=28, weight=ft.FontWeight.BOLD),
+            self.username,
+            self.password,
+            ft.ElevatedButton('Entrar', on_click=self.login),
+            self.login_error,
+        ], width=320))
+
+    async def login(self, e):
+        try:
+            data = await self.api.post('/api/login/', {
+                'username': self.username.value, 'password': self.password.value
+            })
+        except ApiError as error:
+            self.login_error.value = error.message
+            self.page.update()
+            return
+        except httpx.HTTPError:
+            self.login_error.value = 'Servidor indisponível'
+            self.page.update()
+            return
+
+        self.session = {'token': data['token'], 'user': data['user']}
+        self.store.set_meta('session', self.session)
+        self.api.token = self.session['token']
+        self.password.value = ''
+        self.login_error.value = ''
+        self.worker.wake()
+        self.show_terminal()
+
+    async def logout(self, e):
+        try:
+            await self.api.post('/api/logout/', {})
+        except (ApiError, httpx.HTTPError):
+            pass
+        self.end_session()
+        self.show_login()
+
+    def end_session(self):
+        self.session = None
+        self.store.set_meta('session', None)
+        self.api.token = None
 
+    # Caixa
 
-def main(page: ft.Page):
-    counter = ft.Text("0", size=50, data=0)
-
-    def increment_click(e):
-        counter.data += 1
-        counter.value = str(counter.data)
-        counter.update()
-
-    page.floating_action_button = ft.FloatingActionButton(
-        icon=ft.Icons.ADD, on_click=increment_click
-    )
-    page.add(
-        ft.SafeArea(
-            ft.Container(
-                counter,
-                alignment=ft.alignment.center,
-            ),
-            expand=True,
+    def show_terminal(self):
+        self.page.controls.clear()
+        self.load_payment_methods()
+        self.page.add(
+            ft.Row([
+                ft.Text(self.session['user']['name'] or self.session['user']['username'], size=16),
+                ft.TextButton('Sair', on_click=self.logout),
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            ft.Row([self.barcode, self.search]),
+            self.suggestions,
+            ft.Container(self.items, expand=True),
+            ft.Row([self.payment_method, self.total], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            ft.Row([
+                ft.OutlinedButton('Cancelar', on_click=self.clear_cart),
+                ft.FilledButton('Finalizar venda', on_click=self.finish_sale),
+            ], alignment=ft.MainAxisAlignment.END),
+            self.status,
         )
-    )
+        self.barcode.focus()
+
+    def load_payment_methods(self):
+        selected = self.payment_method.value
+        self.payment_method.options = [
+            ft.dropdown.Option(str(method['id']), method['name']) for method in self.store.payment_methods()
+        ]
+        if selected is None and self.payment_method.options:
+            selected = self.payment_method.options[0].key
+        self.payment_method.value = selected
+
+    def notify(self, message):
+        self.page.open(ft.SnackBar(ft.Text(message)))
+
+    async def scan(self, e):
+        code = self.barcode.value.strip()
+        self.barcode.value = ''
+        if code:
+            product = self.store.product_by_barcode(code) or await self.remote_product(code)
+            if product is None:
+                self.notify('Produto não encontrado' if self.store.catalog_loaded()
+                            else 'Catálogo ainda carregando; tente novamente em instantes')
+            else:
+                self.add_to_cart(product)
+        self.barcode.focus()
+        self.page.update()
+
+    async def remote_product(self, code):
+        # Produto cadastrado depois da última sincronização: pergunta ao
+        # backend (bipagens repetidas do mesmo código viram uma requisição)
+        if not self.online:
+            return None
+        try:
+            product = await self.api.get(f'/api/products/barcode/{quote(code, safe="")}/')
+        except (ApiError, httpx.HTTPError):
+            return None
+        self.worker.wake()
+        return product
+
+    async def search_products(self, e):
+        text = self.search.value.strip()
+        if len(text) < SEARCH_MIN_LENGTH:
+            self.show_suggestions([])
+            return
+
+        results = None
+        if self.online:
+            try:
+                # Só a busca da última tecla importa; as anteriores são canceladas
+                page = await self.api.latest('search', '/api/products/', {'search': text, 'limit': SEARCH_LIMIT})
+                if page is None:
+                    return
+                results = [dict(row, category_name=row['category__name']) for row in page['results']]
+            except (ApiError, httpx.HTTPError):
+                pass
+        if results is None:
+            results = self.store.search(text, SEARCH_LIMIT)
+        self.show_suggestions(results)
+
+    def show_suggestions(self, products):
+        self.suggestions.controls = [
+            ft.ListTile(
+                title=ft.Text(product['name']),
+                subtitle=ft.Text(f'{product["category_name"] or ""} · {money(product["price"])}'),
+                dense=True,
+                on_click=lambda e, product=product: self.pick(product),
+            )
+            for product in products
+        ]
+        self.page.update()
+
+    def pick(self, product):
+        self.search.value = ''
+        self.suggestions.controls = []
+        self.add_to_cart(product)
+        self.barcode.focus()
+        self.page.update()
+
+    def add_to_cart(self, product):
+        line = self.cart.setdefault(product['id'], {'product': product, 'quantity': 0})
+        line['quantity'] += 1
+        self.render_cart()
+
+    def remove(self, product_id):
+        self.cart.pop(product_id, None)
+        self.render_cart()
+        self.page.update()
+
+    def render_cart(self):
+        self.items.controls = [
+            ft.ListTile(
+                title=ft.Text(line['product']['name']),
+                subtitle=ft.Text(f'{line["quantity"]} x {money(line["product"]["price"])}'),
+                trailing=ft.IconButton(ft.Icons.DELETE_OUTLINE,
+                                       on_click=lambda e, product_id=product_id: self.remove(product_id)),
+            )
+            for product_id, line in self.cart.items()
+        ]
+        self.total.value = money(sum(
+            Decimal(line['product']['price']) * line['quantity'] for line in self.cart.values()
+        ))
+
+    def clear_cart(self, e=None):
+        self.cart.clear()
+        self.render_cart()
+        self.barcode.focus()
+        self.page.update()
+
+    def finish_sale(self, e):
+        if not self.cart:
+            self.notify('Carrinho vazio')
+        elif not self.payment_method.value:
+            self.notify('Escolha a forma de pagamento')
+        else:
+            # Sempre pela fila local: a venda não espera a rede
+            self.store.enqueue_sale({
+                'username': self.session['user']['username'],
+                'payment_method_id': int(self.payment_method.value),
+                'items': [
+                    {'product_id': product_id, 'quantity': line['quantity']} for product_id, line in self.cart.items()
+                ],
+            })
+            self.worker.wake()
+            self.notify(f'Venda registrada: {self.total.value}')
+            self.clear_cart()
+        self.page.update()
+
+    # Chamado pelo SyncWorker
+
+    def show_status(self, status):
+        self.online = status.online
+        if status.auth_required and self.session:
+            self.end_session()
+            self.show_login()
+            self.login_error.value = 'Sessão expirada; entre novamente'
+            self.page.update()
+            return
+
+        parts = ['Online' if status.online else 'Offline']
+        parts.append(f'{status.products} produtos' if status.catalog_loaded
+                     else f'Carregando catálogo ({status.products} produtos)')
+        if status.pending_sales:
+            parts.append(f'{status.pending_sales} vendas a enviar')
+        if status.failed_sales:
+            parts.append(f'{status.failed_sales} vendas recusadas')
+        self.status.value = ' · '.join(parts)
+        self.status.color = ft.Colors.GREY_700 if status.online else ft.Colors.ORANGE
+
+        if self.session:
+            self.load_payment_methods()
+        self.page.update()
+
+
+async def main(page: ft.Page):
+    Terminal(page, LocalStore(data_path()), api.shared()).start()
 
 
 ft.app(main)
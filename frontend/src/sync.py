@@ -0,0 +1,113 @@
+import asyncio
+from dataclasses import dataclass
+
+import httpx
+
+from api import ApiError, SessionExpired
+
+# Sincronização em segundo plano do terminal: envia as vendas da fila local
+# (/api/sales/sync/, com chave de idempotência, então reenvios após uma queda
+# não duplicam vendas) e puxa as alterações do cadastro desde a última
+# sequência aplicada (/api/catalog/changes/). Roda como tarefa no event loop
+# do Flet, pelo cliente HTTP compartilhado (api.ApiClient).
+
+CATALOG_PAGE_SIZE = 5000
+SALES_PER_REQUEST = 100
+
+
+@dataclass
+class SyncStatus:
+    online: bool
+    catalog_loaded: bool
+    products: int
+    pending_sales: int
+    failed_sales: int
+    auth_required: bool = False
+    error: str = ''
+
+
+class SyncWorker:
+    def __init__(self, store, api, interval=30, retry_interval=5, on_status=None):
+        self.store = store
+        self.api = api
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.on_status = on_status
+        self._wake = None
+        self._task = None
+
+    def start(self):
+        """Agenda a sincronização no event loop atual."""
+        self._wake = asyncio.Event()
+        self._task = asyncio.ensure_future(self.run())
+
+    def wake(self):
+        """Sincroniza já (ex.: logo após uma venda ou um novo login)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self):
+        while True:
+            online = await self.sync()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval if online else self.retry_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def sync(self):
+        auth_required, error = False, ''
+        try:
+            if self.api.token:
+                # Vendas primeiro: o cadastro pode esperar, o caixa não
+                await self.push_sales()
+                await self.pull_catalog()
+            online = True
+        except SessionExpired:
+            online, auth_required = True, True
+        except (httpx.HTTPError, ApiError, ValueError) as e:
+            online, error = False, str(e)
+
+        self.report(online, auth_required, error)
+        return online
+
+    async def push_sales(self):
+        while True:
+            batch = self.store.pending_sales(SALES_PER_REQUEST)
+            if not batch:
+                return
+            keys, payloads = zip(*batch)
+            data = await self.api.post('/api/sales/sync/', {'sales': list(payloads)})
+            self.store.finish_sales(keys, sorted(data['results'], key=lambda result: result['index']))
+            self.report(True)
+
+    async def pull_catalog(self):
+        while True:
+            page = await self.api.get('/api/catalog/changes/', {
+                'since': self.store.catalog_since(), 'limit': CATALOG_PAGE_SIZE
+            })
+            # Milhares de linhas por página: grava fora do event loop
+            await asyncio.to_thread(self.store.apply_changes, page)
+            if not page['has_more']:
+                return
+            # Progresso da primeira carga
+            self.report(True)
+
+    def report(self, online, auth_required=False, error=''):
+        if self.on_status is None:
+            return
+        counts = self.store.sale_counts()
+        self.on_status(SyncStatus(
+            online=online,
+            catalog_loaded=self.store.catalog_loaded(),
+            products=self.store.product_count(),
+            pending_sales=counts['pending'],
+            failed_sales=counts['failed'],
+            auth_required=auth_required,
+            error=error,
+        ))
@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+
+import httpx
+
+from api import ApiClient, SessionExpired
+
+
+class FakeBackend:
+    """Transporte em memória: cada requisição espera `release` antes de responder."""
+
+    def __init__(self):
+        self.requests = []
+        self.cancelled = []
+        self.release = asyncio.Event()
+
+    async def handle(self, request):
+        self.requests.append(request)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(request)
+            raise
+        if request.url.path == '/api/secret/':
+            return httpx.Response(401, json={'status': 'error', 'message': 'Token inválido'})
+        return httpx.Response(200, json={
+            'search': request.url.params.get('search'),
+            'auth': request.headers.get('Authorization'),
+        })
+
+
+class ApiClientTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend = FakeBackend()
+        self.api = ApiClient('http://pdv.test', token='abc', transport=httpx.MockTransport(self.backend.handle))
+        self.addAsyncCleanup(self.api.aclose)
+
+    async def settle(self):
+        # Deixa as tarefas pendentes chegarem ao transporte
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    async def test_identical_inflight_gets_share_one_request(self):
+        waiters = [asyncio.ensure_future(self.api.get('/api/products/', {'search': 'arroz'})) for _ in range(10)]
+        other = asyncio.ensure_future(self.api.get('/api/products/', {'search': 'feijao'}))
+        await self.settle()
+        self.backend.release.set()
+
+        results = await asyncio.gather(*waiters)
+        self.assertEqual(len(self.backend.requests), 2)
+        self.assertEqual(results, [{'search': 'arroz', 'auth': 'Bearer abc'}] * 10)
+        self.assertEqual((await other)['search'], 'feijao')
+
+        # Só requisições em andamento são compartilhadas; não é um cache
+        await self.api.get('/api/products/', {'search': 'arroz'})
+        self.assertEqual(len(self.backend.requests), 3)
+
+    async def test_newer_request_supersedes_pending_one_in_the_same_slot(self):
+        first = asyncio.ensure_future(self.api.latest('search', '/api/products/', {'search': 'ar'}))
+        await self.settle()
+        second = asyncio.ensure_future(self.api.latest('search', '/api/products/', {'search': 'arr'}))
+        await self.settle()
+        self.backend.release.set()
+
+        self.assertIsNone(await first)
+        self.assertEqual((await second)['search'], 'arr')
+        self.assertEqual([request.url.params['search'] for request in self.backend.cancelled], ['ar'])
+
+    async def test_cancelling_one_waiter_keeps_the_shared_request(self):
+        kept = asyncio.ensure_future(self.api.get('/api/products/barcode/789/'))
+        dropped = asyncio.ensure_future(self.api.get('/api/products/barcode/789/'))
+        await self.settle()
+
+        dropped.cancel()
+        await self.settle()
+        self.backend.release.set()
+
+        self.assertEqual((await kept)['auth'], 'Bearer abc')
+        self.assertTrue(dropped.cancelled())
+        self.assertEqual(len(self.backend.requests), 1)
+        self.assertEqual(self.backend.cancelled, [])
+
+    async def test_request_is_cancelled_when_every_waiter_gives_up(self):
+        waiters = [asyncio.ensure_future(self.api.get('/api/products/barcode/789/')) for _ in range(2)]
+        await self.settle()
+
+        for waiter in waiters:
+            waiter.cancel()
+        await self.settle()
+
+        self.assertEqual(len(self.backend.cancelled), 1)
+        self.assertEqual(self.api._inflight, {})
+
+    async def test_unauthorized_raises_session_expired(self):
+        self.backend.release.set()
+        with self.assertRaises(SessionExpired) as raised:
+            await self.api.get('/api/secret/')
+        self.assertEqual(raised.exception.message, 'Token inválido')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from local_store import LocalStore
+
+
+def page(changes=None, deleted=None, next_since=1, has_more=False):
+    return {
+        'changes': changes or {},
+        'deleted': deleted or {},
+        'next_since': next_since,
+        'has_more': has_more,
+    }
+
+
+class LocalStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = LocalStore(Path(directory.name) / 'terminal.sqlite3')
+        self.addCleanup(self.store.close)
+
+
+class ApplyChangesTests(LocalStoreTestCase):
+    def test_upserts_rows_and_removes_tombstones(self):
+        self.store.apply_changes(page({
+            'products': [
+                {'id': 1, 'name': 'Arroz', 'price': '22.90', 'barcode': '789', 'category_id': 10},
+                {'id': 2, 'name': 'Feijão', 'price': '8.50', 'barcode': '790', 'category_id': 10},
+            ],
+            'categories': [{'id': 10, 'name': 'Mercearia'}],
+            'payment_methods': [{'id': 5, 'name': 'Dinheiro'}, {'id': 6, 'name': 'Cartão'}],
+        }, next_since=4))
+
+        self.store.apply_changes(page(
+            {'products': [{'id': 1, 'name': 'Arroz integral', 'price': '24.00', 'barcode': '789', 'category_id': 10}]},
+            {'products': [2], 'payment_methods': [6]},
+            next_since=7,
+        ))
+
+        self.assertEqual(self.store.product_by_barcode('789'), {
+            'id': 1, 'name': 'Arroz integral', 'price': '24.00', 'barcode': '789', 'category_name': 'Mercearia'
+        })
+        self.assertIsNone(self.store.product_by_barcode('790'))
+        self.assertEqual(self.store.product_count(), 1)
+        self.assertEqual(self.store.payment_methods(), [{'id': 5, 'name': 'Dinheiro'}])
+        self.assertEqual(self.store.catalog_since(), 7)
+
+    def test_catalog_is_loaded_after_the_last_page(self):
+        self.assertEqual((self.store.catalog_since(), self.store.catalog_loaded()), (0, False))
+
+        self.store.apply_changes(page(next_since=5000, has_more=True))
+        self.assertEqual((self.store.catalog_since(), self.store.catalog_loaded()), (5000, False))
+
+        self.store.apply_changes(page(next_since=5200))
+        self.assertEqual((self.store.catalog_since(), self.store.catalog_loaded()), (5200, True))
+
+    def test_failed_page_leaves_rows_and_sequence_untouched(self):
+        self.store.apply_changes(page({'categories': [{'id': 10, 'name': 'Mercearia'}]}, next_since=1, has_more=True))
+
+        with self.assertRaises(KeyError):
+            self.store.apply_changes(page({
+                'products': [{'id': 1, 'name': 'Arroz', 'price': '22.90', 'barcode': '789', 'category_id': 10}],
+                # Linha sem o nome: a página inteira é desfeita
+                'payment_methods': [{'id': 5}],
+            }, next_since=2))
+
+        self.assertEqual(self.store.product_count(), 0)
+        self.assertEqual(self.store.catalog_since(), 1)
+        self.assertFalse(self.store.catalog_loaded())
+
+
+class SaleQueueTests(LocalStoreTestCase):
+    def test_finish_sales_removes_accepted_and_keeps_refused(self):
+        keys = [self.store.enqueue_sale({'username': 'caixa', 'items': [{'product_id': 1, 'quantity': n}]})
+                for n in (1, 2, 3)]
+
+        pending = self.store.pending_sales(10)
+        self.assertEqual([key for key, _ in pending], keys)
+        self.assertEqual([payload['idempotency_key'] for _, payload in pending], keys)
+
+        self.store.finish_sales(keys, [
+            {'index': 0, 'status': 'success', 'sale_id': 1},
+            {'index': 1, 'status': 'error', 'message': 'Estoque insuficiente para Arroz: disponível 1'},
+            {'index': 2, 'status': 'success', 'sale_id': 2, 'replayed': True},
+        ])
+
+        self.assertEqual(self.store.pending_sales(10), [])
+        self.assertEqual(self.store.sale_counts(), {'pending': 0, 'failed': 1})
+        with self.store.lock:
+            failed = self.store.db.execute("SELECT key, error FROM sales WHERE status = 'failed'").fetchall()
+        self.assertEqual([tuple(row) for row in failed], [(keys[1], 'Estoque insuficiente para Arroz: disponível 1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+from api import ApiClient, SessionExpired
+from local_store import LocalStore
+from sync import SyncWorker
+
+
+class FakeBackend:
+    """Rotas de sincronização do backend, em memória."""
+
+    def __init__(self):
+        self.requests = []
+        # Páginas de /api/catalog/changes/ por valor de ?since=
+        self.pages = {}
+        self.refused = set()
+        self.status = 200
+
+    def handle(self, request):
+        self.requests.append(request)
+        if self.status == 401:
+            return httpx.Response(401, json={'status': 'error', 'message': 'Token inválido ou expirado'})
+        if request.url.path == '/api/sales/sync/':
+            sales = json.loads(request.content)['sales']
+            results = [
+                {'index': index, 'status': 'error', 'message': 'Estoque insuficiente'}
+                if sale['idempotency_key'] in self.refused
+                else {'index': index, 'status': 'success', 'sale_id': index + 1}
+                for index, sale in enumerate(sales)
+            ]
+            # O terminal não depende da ordem dos resultados
+            return httpx.Response(200, json={'status': 'success', 'results': results[::-1]})
+        if request.url.path == '/api/catalog/changes/':
+            return httpx.Response(200, json=self.pages[int(request.url.params['since'])])
+        return httpx.Response(404, json={'status': 'error', 'message': 'Não encontrado'})
+
+    def paths(self):
+        return [request.url.path for request in self.requests]
+
+
+def catalog_page(products, next_since, has_more=False):
+    return {
+        'changes': {'products': products, 'categories': [], 'payment_methods': []},
+        'deleted': {'products': [], 'categories': [], 'payment_methods': []},
+        'next_since': next_since,
+        'has_more': has_more,
+    }
+
+
+def product(product_id):
+    return {'id': product_id, 'name': f'Produto {product_id}', 'price': '1.00',
+            'barcode': str(product_id), 'category_id': None}
+
+
+class SyncWorkerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = LocalStore(Path(directory.name) / 'terminal.sqlite3')
+        self.addCleanup(self.store.close)
+
+        self.backend = FakeBackend()
+        self.backend.pages[0] = catalog_page([], 0)
+        self.api = ApiClient('http://pdv.test', token='abc', transport=httpx.MockTransport(self.backend.handle))
+        self.addAsyncCleanup(self.api.aclose)
+
+        self.statuses = []
+        self.worker = SyncWorker(self.store, self.api, on_status=self.statuses.append)
+
+    def enqueue(self, count):
+        return [self.store.enqueue_sale({'username': 'caixa', 'items': [{'product_id': 1, 'quantity': 1}]})
+                for _ in range(count)]
+
+    @mock.patch('sync.SALES_PER_REQUEST', 2)
+    async def test_push_sales_sends_the_queue_in_batches(self):
+        keys = self.enqueue(5)
+        self.backend.refused = {keys[3]}
+
+        await self.worker.push_sales()
+
+        sent = [json.loads(request.content)['sales'] for request in self.backend.requests]
+        self.assertEqual([len(sales) for sales in sent], [2, 2, 1])
+        self.assertEqual([sale['idempotency_key'] for sales in sent for sale in sales], keys)
+        self.assertEqual(self.store.sale_counts(), {'pending': 0, 'failed': 1})
+        self.assertEqual([status.pending_sales for status in self.statuses], [3, 1, 0])
+
+    async def test_pull_catalog_follows_pages_until_has_more_is_false(self):
+        self.backend.pages = {
+            0: catalog_page([product(1), product(2)], 2, has_more=True),
+            2: catalog_page([product(3)], 3),
+        }
+
+        await self.worker.pull_catalog()
+
+        self.assertEqual([request.url.params['since'] for request in self.backend.requests], ['0', '2'])
+        self.assertEqual((self.store.catalog_since(), self.store.catalog_loaded()), (3, True))
+        self.assertEqual(self.store.product_count(), 3)
+        # Progresso reportado entre as páginas da primeira carga
+        self.assertEqual([(status.products, status.catalog_loaded) for status in self.statuses], [(2, False)])
+
+    async def test_sync_pushes_sales_before_pulling_the_catalog(self):
+        self.enqueue(1)
+
+        self.assertTrue(await self.worker.sync())
+
+        self.assertEqual(self.backend.paths(), ['/api/sales/sync/', '/api/catalog/changes/'])
+        self.assertEqual(self.statuses[-1].pending_sales, 0)
+        self.assertTrue(self.statuses[-1].online)
+
+    async def test_expired_session_asks_for_login_and_keeps_the_queue(self):
+        self.enqueue(2)
+        self.backend.status = 401
+
+        with self.assertRaises(SessionExpired):
+            await self.worker.push_sales()
+        self.assertTrue(await self.worker.sync())
+
+        status = self.statuses[-1]
+        self.assertEqual((status.online, status.auth_required, status.pending_sales), (True, True, 2))
+        self.assertNotIn('/api/catalog/changes/', self.backend.paths())
+
+    async def test_unreachable_backend_reports_offline(self):
+        self.enqueue(1)
+
+        def unreachable(request):
+            raise httpx.ConnectError('Connection refused', request=request)
+
+        self.api.transport = httpx.MockTransport(unreachable)
+        self.assertFalse(await self.worker.sync())
+
+        status = self.statuses[-1]
+        self.assertEqual((status.online, status.auth_required, status.pending_sales), (False, False, 1))
+        self.assertIn('Connection refused', status.error)
+
+    async def test_without_a_session_nothing_is_sent(self):
+        self.enqueue(1)
+        self.api.token = None
+
+        self.assertTrue(await self.worker.sync())
+
+        self.assertEqual(self.backend.requests, [])
+        self.assertEqual(self.statuses[-1].pending_sales, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()